@@ -1,43 +1,58 @@
 # a sample implementation of the EnglishModel class. Our actual production model
 # contains a more complex set of rules and a custom model. This is a simplified version for demonstration purposes.
-import spacy
-import lemminflect
+# spacy and lemminflect are imported by load_model, so importing this module (e.g. for SENTENCES) stays cheap
 from src.get_forms import GetForms
 from src.sample_english_model import EnglishModel
-import json
+from src.preprocessing.lexicon import open_lexicon
 
-with open('src/adj_to_adv.txt', 'r') as f:
-    ADJECTIVE_TO_ADVERB = json.load(f)
+# memory-mapped, compiled from the JSON files on first use (see src/build_lexicon.py); nothing is parsed at startup
+ADJECTIVE_TO_ADVERB = open_lexicon('src/adj_to_adv.txt')
+ADVERB_TO_ADJECTIVE = open_lexicon('src/adv_to_adj.txt')
 
-with open('src/adv_to_adj.txt', 'r') as f:
-    ADVERB_TO_ADJECTIVE = json.load(f)
+# the sample rules; see EnglishModel for the format
+RULES = [
+    ('aux', ['MD'], ['VBG', 'VBD', 'VBZ'], ['VB'], False, 'Verbs after modals should be in base form'),
+    ('advmod', ['RB', 'JJ'], ['VBD', 'VBZ', 'VBN', 'VBP', 'VBG'], ['RB'], True, 'Adjective/adverb confusion: use an adverb instead'),
+    ('amod', ['RB', 'JJ'], ['VBD', 'VBZ', 'VBN'], ['JJ'], True, 'Adjective/adverb confusion: use an adjective instead'),
+    ('case', ['IN'], ['VB', 'VBD', 'VBZ', 'VBN', 'VBP'], ['VBG'], False, 'A verb after a preposition should be in gerund form'),
+    ('mark', ['IN'], ['VB', 'VBD', 'VBZ', 'VBN', 'VBP'], ['VBG'], False, 'A verb after a subordinating conjunction should be in gerund form')
+]
 
-def main():
-    # note that en_core_web_sm fails on most of the sample rules given below
-    # to see our production model in action, visit https://www.grammacy.com
-    # if you wish to use our production model, visit https://github.com/akuwuh/grammacy-api
-    nlp = spacy.load('data/models/english-v3.1/model-best')
+# note that en_core_web_sm fails on most of the sample rules
+# to see our production model in action, visit https://www.grammacy.com
+# if you wish to use our production model, visit https://github.com/akuwuh/grammacy-api
+MODEL_PATH = 'data/models/english-v3.1/model-best'
+
+# pipeline components the sample rules never read; they are not loaded at all, which cuts startup time and memory
+# (without a lemmatizer, GetForms takes a token's lemma from lemminflect instead)
+UNUSED_COMPONENTS = ['ner', 'lemmatizer']
 
-    sentences = [
-        'You can learning word embeddings by running the following command',                         
-        'I drunk fought that guy and can learning word embeddings too',         
-        'Anxious, they returned home before the storm',                        
-        'This backpack was optimized for carry heavy books',
-        'Max went to the store'
-    ]
+SENTENCES = [
+    'You can learning word embeddings by running the following command',                         
+    'I drunk fought that guy and can learning word embeddings too',         
+    'Anxious, they returned home before the storm',                        
+    'This backpack was optimized for carry heavy books',
+    'Max went to the store'
+]
 
-    rules = [
-        ('aux', ['MD'], ['VBG', 'VBD', 'VBZ'], ['VB'], False, 'Verbs after modals should be in base form'),
-        ('advmod', ['RB', 'JJ'], ['VBD', 'VBZ', 'VBN', 'VBP', 'VBG'], ['RB'], True, 'Adjective/adverb confusion: use an adverb instead'),
-        ('amod', ['RB', 'JJ'], ['VBD', 'VBZ', 'VBN'], ['JJ'], True, 'Adjective/adverb confusion: use an adjective instead'),
-        ('case', ['IN'], ['VB', 'VBD', 'VBZ', 'VBN', 'VBP'], ['VBG'], False, 'A verb after a preposition should be in gerund form'),
-        ('mark', ['IN'], ['VB', 'VBD', 'VBZ', 'VBN', 'VBP'], ['VBG'], False, 'A verb after a subordinating conjunction should be in gerund form')
-    ]
+# loads the spaCy pipeline and builds an EnglishModel with the sample rules around it
+# adjective_to_adverb/adverb_to_adjective: the maps to use instead of the ones above
+# nlp: an already loaded pipeline to use instead of loading model_path
+# exclude: components of model_path not to load
+def load_model(model_path=MODEL_PATH, rules=RULES, adjective_to_adverb=None, adverb_to_adjective=None, nlp=None, 
+               exclude=UNUSED_COMPONENTS):
+    if nlp is None:
+        import spacy
+        nlp = spacy.load(model_path, exclude=exclude)
+    import lemminflect
+    gf = GetForms(nlp, lemminflect, adjective_to_adverb or ADJECTIVE_TO_ADVERB, adverb_to_adjective or ADVERB_TO_ADJECTIVE)
+    return EnglishModel(nlp, gf, rules)
 
-    gf = GetForms(nlp, lemminflect, ADJECTIVE_TO_ADVERB, ADVERB_TO_ADJECTIVE)
-    em = EnglishModel(nlp, gf, rules)
+def main():
+    em = load_model()
+    nlp = em.nlp
     
-    for s in sentences:
+    for s in SENTENCES:
         for token in nlp(s):
             print(token.text, token.tag_, token.morph)
         print()
@@ -0,0 +1,315 @@
+# a small HTTP grammar-checking service around EnglishModel
+# requests that arrive within max_wait seconds of each other are checked together in one nlp.pipe call (micro-batching),
+# which is how a single model per process gets useful throughput on CPU. the event loop keeps accepting requests while
+# a batch runs in a worker thread, so the next batch fills up in the meantime
+# POST /check {"text": "..."} -> the EnglishModel.format_errors JSON for that text
+# GET /health -> {"status": "ok"}
+# run the server:   python server.py [--host 127.0.0.1] [--port 8080] [--model data/models/english-v3.1/model-best] [--workers N]
+# try it out:       python server.py --client ["some text" ...]   (sends the sample sentences concurrently by default)
+# with --workers N (POSIX only), the model and the adjective/adverb lexicons are loaded once, then N worker processes are
+# forked and share them copy-on-write, all accepting on the same socket (see serve_prefork)
+import argparse
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_BODY_SIZE = 1 << 20
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+# serve_prefork waits RESPAWN_DELAY seconds before replacing a worker that exited, doubling for every other exit within
+# RESPAWN_WINDOW seconds (up to RESPAWN_MAX_DELAY), and gives up after RESPAWN_LIMIT exits within RESPAWN_WINDOW
+RESPAWN_DELAY = 0.1
+RESPAWN_MAX_DELAY = 5.0
+RESPAWN_WINDOW = 60.0
+RESPAWN_LIMIT = 10
+
+class MicroBatcher:
+    '''Collects concurrent check requests into batches for EnglishModel.enforce_many'''
+
+    # model: an EnglishModel
+    # max_batch_size: most texts per nlp.pipe call
+    # max_wait: seconds a batch stays open for more requests after its first one arrives
+    def __init__(self, model, max_batch_size: int=32, max_wait: float=0.005):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        # a single thread, so the pipeline only ever runs one batch at a time
+        self.executor = ThreadPoolExecutor(1)
+
+    # the format_errors JSON for text, once the batch it ends up in is done
+    async def check(self, text: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    # forms and runs batches until cancelled
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self._enforce_batch, texts)
+            except Exception:
+                # check the texts one by one so one bad text only fails its own request
+                results = []
+                for text in texts:
+                    try:
+                        results.append(await loop.run_in_executor(self.executor, self.model.enforce, text))
+                    except Exception as e:
+                        results.append(e)
+
+            for (_, future), result in zip(batch, results):
+                if future.done():    # the client went away
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _enforce_batch(self, texts: list[str]) -> list[str]:
+        return list(self.model.enforce_many(texts, batch_size=len(texts)))
+
+def _response(status: int, body: str, keep_alive: bool) -> bytes:
+    payload = body.encode('utf-8')
+    head = (f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    return head.encode('latin-1') + payload
+
+def _error(message: str) -> str:
+    return json.dumps({'error': message})
+
+# (status, body) for one request
+async def _route(batcher: MicroBatcher, method: str, path: str, body: bytes) -> tuple[int, str]:
+    if path == '/health':
+        return 200, json.dumps({'status': 'ok'})
+    if path != '/check':
+        return 404, _error(f'No such endpoint: {path}')
+    if method != 'POST':
+        return 405, _error('Use POST /check')
+
+    try:
+        text = json.loads(body)['text']
+        if not isinstance(text, str):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return 400, _error('Expected a JSON body {"text": "..."}')
+
+    try:
+        return 200, await batcher.check(text)
+    except Exception as e:
+        return 500, _error(str(e))
+
+# serves HTTP/1.1 requests on one connection until the client closes it or asks to
+async def _handle(batcher: MicroBatcher, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            try:
+                method, path, version = request_line.decode('latin-1').split()
+            except ValueError:
+                writer.write(_response(400, _error('Malformed request line'), False))
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+            try:
+                length = int(headers.get('content-length', 0) or 0)
+                if length < 0:
+                    raise ValueError
+            except ValueError:
+                writer.write(_response(400, _error('Invalid Content-Length'), False))
+                break
+            if length > MAX_BODY_SIZE:
+                writer.write(_response(413, _error(f'Body larger than {MAX_BODY_SIZE} bytes'), False))
+                break
+            body = await reader.readexactly(length) if length else b''
+
+            status, response = await _route(batcher, method, path.split('?')[0], body)
+            writer.write(_response(status, response, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+# serves model on host:port (or an already listening sock) until cancelled
+async def serve(model, host: str='127.0.0.1', port: int=8080, max_batch_size: int=32, max_wait: float=0.005, sock=None):
+    batcher = MicroBatcher(model, max_batch_size, max_wait)
+    batch_task = asyncio.create_task(batcher.run())
+    handle = lambda reader, writer: _handle(batcher, reader, writer)
+    if sock is not None:
+        server = await asyncio.start_server(handle, sock=sock)
+    else:
+        server = await asyncio.start_server(handle, host, port)
+        print(f'Serving on http://{host}:{port}')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+        batcher.executor.shutdown(wait=False)
+
+# pre-fork serving: model (and everything it holds, e.g. Lexicons) is already loaded in this process, which opens the
+# listening socket and forks workers that each run serve() on it. the workers share the loaded pipeline copy-on-write,
+# and a worker that dies is replaced, with a backoff (see RESPAWN_DELAY). blocks until interrupted (Ctrl+C or SIGTERM), 
+# then stops every worker; raises RuntimeError if workers keep exiting (e.g. crashing on startup)
+def serve_prefork(model, host: str='127.0.0.1', port: int=8080, workers: int=2, max_batch_size: int=32, max_wait: float=0.005):
+    if not hasattr(os, 'fork'):
+        raise RuntimeError('Pre-fork serving needs os.fork, which this platform does not have; use a single worker')
+
+    sock = socket.create_server((host, port), backlog=1024)
+    # keep what's loaded so far out of the collector's reach; otherwise the first collection in every worker writes to 
+    # (and so copies) every page holding the model's objects
+    gc.collect()
+    gc.freeze()
+
+    children = set()
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                asyncio.run(serve(model, max_batch_size=max_batch_size, max_wait=max_wait, sock=sock))
+            except Exception:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    stopping = False
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for _ in range(workers):
+        spawn()
+    # handled here rather than as KeyboardInterrupt, so waiting on the workers is never cut short
+    previous = {signum: signal.signal(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+    print(f'Serving on http://{host}:{port} with {workers} workers')
+
+    exits = []    # times of recent worker exits
+    gave_up = False
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            children.discard(pid)
+            if stopping:
+                continue
+
+            code = os.waitstatus_to_exitcode(status)
+            reason = f'was killed by signal {-code}' if code < 0 else f'exited with code {code}'
+            now = time.monotonic()
+            exits = [t for t in exits if now - t < RESPAWN_WINDOW] + [now]
+            if len(exits) >= RESPAWN_LIMIT:
+                print(f'Worker {pid} {reason}; {len(exits)} workers exited within {RESPAWN_WINDOW} seconds, giving up')
+                gave_up = True
+                stop()
+                continue
+
+            delay = min(RESPAWN_MAX_DELAY, RESPAWN_DELAY * 2 ** (len(exits) - 1))
+            print(f'Worker {pid} {reason}, starting a new one in {delay} seconds')
+            time.sleep(delay)
+            if not stopping:
+                spawn()
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        sock.close()
+
+    if gave_up:
+        raise RuntimeError('Workers keep exiting; see the errors above')
+
+# stub client: POSTs text to /check and returns the parsed response
+async def request_check(text: str, host: str='127.0.0.1', port: int=8080) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps({'text': text}).encode('utf-8')
+    writer.write((f'POST /check HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                  f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+# sends every text at once and prints what comes back
+async def run_client(texts: list[str], host: str, port: int):
+    start = time.time()
+    results = await asyncio.gather(*(request_check(text, host, port) for text in texts))
+    for text, result in zip(texts, results):
+        print(text)
+        print(f'\t{result}')
+    print(f'{len(texts)} requests in {time.time()-start} seconds')
+
+def main():
+    parser = argparse.ArgumentParser(description='grammaCy HTTP grammar-checking service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--model', default=None, help='spaCy pipeline to load (default: the one main.py uses)')
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait', type=float, default=0.005, help='seconds a batch waits for more requests')
+    parser.add_argument('--exclude', nargs='*', default=None, metavar='COMPONENT', 
+                        help='pipeline components not to load (default: the ones the rules never read, see main.py)')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes forked after loading the model (POSIX only)')
+    parser.add_argument('--client', nargs='*', metavar='TEXT', help='send TEXTs (default: the sample sentences) to a running server')
+    args = parser.parse_args()
+
+    if args.client is not None:
+        from main import SENTENCES
+        asyncio.run(run_client(args.client or SENTENCES, args.host, args.port))
+        return
+
+    from main import MODEL_PATH, UNUSED_COMPONENTS, load_model
+    # the adjective/adverb maps are memory-mapped Lexicons, so forked workers share one copy of them through the page cache
+    model = load_model(args.model or MODEL_PATH, exclude=UNUSED_COMPONENTS if args.exclude is None else args.exclude)
+    if args.workers > 1:
+        serve_prefork(model, args.host, args.port, args.workers, args.max_batch_size, args.max_wait)
+        return
+
+    try:
+        asyncio.run(serve(model, args.host, args.port, args.max_batch_size, args.max_wait))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
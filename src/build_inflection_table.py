@@ -0,0 +1,33 @@
+# builds the optional lemma -> inflections table used by GetForms, so generating suggestions never needs the parser
+# lemmas are collected from the lemma column of a CoNLL-U corpus (only for POS that lemminflect can inflect)
+# usage: python src/build_inflection_table.py <conllu_dir> <out_file>
+import json
+import os
+import sys
+import lemminflect
+from get_forms import GetForms
+
+INFLECTABLE_POS = {'NOUN', 'PROPN', 'VERB', 'AUX', 'ADJ', 'ADV'}
+
+def collect_lemmas(data_dir: str) -> set[str]:
+    lemmas = set()
+    for root, _, filenames in os.walk(data_dir):
+        for filename in filenames:
+            if not filename.endswith('.conllu'):
+                continue
+            with open(os.path.join(root, filename), 'r', encoding='utf-8') as f:
+                for line in f:
+                    cols = line.rstrip('\n').split('\t')
+                    if len(cols) == 10 and cols[3] in INFLECTABLE_POS:
+                        lemmas.add(cols[2].lower())
+    return lemmas
+
+def main():
+    data_dir, out_file = sys.argv[1], sys.argv[2]
+    table = GetForms.build_inflection_table(lemminflect, sorted(collect_lemmas(data_dir)))
+    with open(out_file, 'w', encoding='utf-8') as f:
+        json.dump(table, f, indent=4)
+    print(f'wrote inflections for {len(table)} lemmas to {out_file}')
+
+if __name__ == '__main__':
+    main()
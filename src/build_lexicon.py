@@ -0,0 +1,35 @@
+# compiles the JSON adjective <-> adverb maps into the memory-mapped lexicon format (see preprocessing/lexicon.py)
+# main.py and the augmentors compile them on first use anyway; run this to rebuild them ahead of time, e.g. when deploying
+# usage: python src/build_lexicon.py [<json_file> [<out_file>]]   (default: both src/adj_to_adv.txt and src/adv_to_adj.txt)
+import json
+import os
+import sys
+import time
+from preprocessing.lexicon import Lexicon, write_lexicon
+
+DEFAULT_FILES = ['src/adj_to_adv.txt', 'src/adv_to_adj.txt']
+
+def build(json_file: str, out_file: str=None):
+    out_file = out_file or os.path.splitext(json_file)[0] + '.lex'
+    start = time.time()
+    with open(json_file, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+    write_lexicon(mapping, out_file)
+
+    # check the compiled file answers exactly like the JSON
+    lexicon = Lexicon(out_file)
+    if len(lexicon) != len(mapping) or any(lexicon.get(key) != value for key, value in mapping.items()):
+        raise ValueError(f'{out_file} does not match {json_file}')
+    lexicon.close()
+    print(f'wrote {len(mapping)} entries from {json_file} to {out_file} '
+          f'({os.path.getsize(out_file)} bytes) in {time.time()-start} seconds')
+
+def main():
+    if len(sys.argv) > 1:
+        build(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        for json_file in DEFAULT_FILES:
+            build(json_file)
+
+if __name__ == '__main__':
+    main()
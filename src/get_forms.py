@@ -1,31 +1,101 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# upos that lemminflect's standalone getLemma expects for each target tag
+TAG_TO_UPOS = {
+    'VB': 'VERB', 'VBD': 'VERB', 'VBG': 'VERB', 'VBN': 'VERB', 'VBP': 'VERB', 'VBZ': 'VERB',
+    'NN': 'NOUN', 'NNS': 'NOUN',
+    'NNP': 'PROPN', 'NNPS': 'PROPN',
+    'JJ': 'ADJ', 'JJR': 'ADJ', 'JJS': 'ADJ',
+    'RB': 'ADV', 'RBR': 'ADV', 'RBS': 'ADV',
+}
+
 class GetForms():
-    def __init__(self, nlp, lemminflect, ADJECTIVE_TO_ADVERB, ADVERB_TO_ADJECTIVE):
+    # INFLECTIONS: optional {lemma: {tag: form}} table built offline with build_inflection_table
+    #   when given, suggestions are built with lemminflect's standalone functions and never run the parser
+    # cache_size: max number of (word, tag, lemma) results kept in the LRU cache
+    # counters: optional collections.Counter; counts, for every get_forms call (cached results included) and without any I/O,
+    #   'found' and 'not_found' (whether a suggestion was found) and 'adj_to_adv_lookups' and 'adv_to_adj_lookups'
+    #   (calls that consult the adjective/adverb maps). LRU cache hits are in _cached_forms.cache_info()
+    def __init__(self, nlp, lemminflect, ADJECTIVE_TO_ADVERB, ADVERB_TO_ADJECTIVE, INFLECTIONS=None, cache_size: int=4096, counters=None):
         self.nlp = nlp
         self.lemminflect = lemminflect
         self.ADJECTIVE_TO_ADVERB = ADJECTIVE_TO_ADVERB
         self.ADVERB_TO_ADJECTIVE = ADVERB_TO_ADJECTIVE
+        self.INFLECTIONS = INFLECTIONS
+        self.counters = counters
+        self._cached_forms = lru_cache(maxsize=cache_size)(self._get_forms)
+
+    # builds {lemma: {tag: form}} for the given lemmas using lemminflect's standalone functions
+    # run this offline (e.g. over the lemma column of a corpus) and save it with json.dump
+    @staticmethod
+    def build_inflection_table(lemminflect, lemmas) -> dict:
+        table = {}
+        for lemma in lemmas:
+            inflections = lemminflect.getAllInflections(lemma)
+            if inflections:
+                table[lemma] = {tag: forms[0] for tag, forms in inflections.items()}
+        return table
 
     # get the {tag} form of {word}
-    def get_forms(self, word: str, tag: str) -> str:
-        lemma = self.nlp(word)[0]._.lemma()
+    # word can also be a spaCy Token, in which case the lemma it already got from its sentence is reused
+    # lemma: optional precomputed lemma of word; skips the lemma lookup entirely
+    def get_forms(self, word, tag: str, lemma: str=None) -> str:
+        if not isinstance(word, str):
+            lemma = lemma or word.lemma_ or word._.lemma()
+            word = word.text
+        form = self._cached_forms(word, tag, lemma)
+        if self.counters is not None:
+            if tag in ['RB', 'RBR', 'RBS']:
+                self.counters['adj_to_adv_lookups'] += 1
+            elif tag in ['JJ', 'JJR', 'JJS']:
+                self.counters['adv_to_adj_lookups'] += 1
+            self.counters['found' if form else 'not_found'] += 1
+        return form
+
+    # lemma of {word} without running the pipeline, using the POS implied by the target tag
+    def _lookup_lemma(self, word: str, tag: str) -> str:
+        lemmas = self.lemminflect.getLemma(word, upos=TAG_TO_UPOS.get(tag, 'VERB'))
+        return lemmas[0] if lemmas else word
+
+    # {tag} form of {lemma}, preferring the precomputed table if there is one
+    def _lookup_inflection(self, lemma: str, tag: str) -> str:
+        form = self.INFLECTIONS.get(lemma, {}).get(tag) if self.INFLECTIONS is not None else None
+        if form is None:
+            forms = self.lemminflect.getInflection(lemma, tag=tag)
+            form = forms[0] if forms else None
+        return form
+
+    def _get_forms(self, word: str, tag: str, lemma: str=None) -> str:
+        # only parse the word in isolation if we have neither a lemma nor the offline table
+        parse = lemma is None and self.INFLECTIONS is None
+        if parse:
+            lemma = self.nlp(word)[0]._.lemma()
+        elif lemma is None:
+            lemma = self._lookup_lemma(word, tag)
         word = word.lower()
         
         if tag in ['RB', 'RBR', 'RBS']:
             if word in self.ADJECTIVE_TO_ADVERB:
                 form = self.ADJECTIVE_TO_ADVERB[word]
-                print(f'Found {tag} form for {word}: {form}')
+                logger.debug('Found %s form for %s: %s', tag, word, form)
                 return form
         elif tag in ['JJ', 'JJR', 'JJS']:
             if word in self.ADVERB_TO_ADJECTIVE:
                 form = self.ADVERB_TO_ADJECTIVE[word]
-                print(f'Found {tag} form for {word}: {form}')
+                logger.debug('Found %s form for %s: %s', tag, word, form)
                 return form
         
         # other than adjective/adverb conversion, we don't need to convert cross-POS and can use lemminflect to convert within the same POS
-        form = self.nlp(lemma)[0]._.inflect(tag)
+        if parse:
+            form = self.nlp(lemma)[0]._.inflect(tag)
+        else:
+            form = self._lookup_inflection(lemma, tag)
         if form != word:
-            print(f'Found {tag} form for {word}: {form}')
+            logger.debug('Found %s form for %s: %s', tag, word, form)
             return form
     
-        print(f'Could not find {tag} form for: {word}')
-        return None
\ No newline at end of file
+        logger.debug('Could not find %s form for: %s', tag, word)
+        return None
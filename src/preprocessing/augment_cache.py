@@ -0,0 +1,84 @@
+# content-hash cache for incremental augmentation runs
+# every augmented input file gets its augmentations stored in cache_dir, and manifest.json records, per file (relative
+# to data_dir), the hash of its contents and the hash of the augmentor settings (rules, seed, ...) they were made with
+# on the next run, a file whose contents and settings hashes both match is not augmented again; its stored output is reused
+import hashlib
+import json
+import os
+
+MANIFEST = 'manifest.json'
+
+# sha256 of a file's contents, read in blocks so large files don't have to fit in memory
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class AugmentCache:
+    '''Manifest of (input file hash, settings hash) -> stored augmentations'''
+
+    # settings: everything besides the input file that changes the augmentations (rules, seed, chunk_size, ...)
+    # extension: of the stored augmentations, 'conllu' or 'spacy' (DocBin)
+    def __init__(self, cache_dir: str, data_dir: str, settings: dict, extension: str='conllu'):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.data_dir = data_dir
+        self.extension = extension
+        self.settings_hash = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        self.file_hashes = {}
+
+        manifest_path = os.path.join(cache_dir, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {}
+
+    def _relpath(self, conllu_path: str) -> str:
+        return os.path.relpath(conllu_path, self.data_dir).replace(os.sep, '/')
+
+    def _file_hash(self, conllu_path: str) -> str:
+        if conllu_path not in self.file_hashes:
+            self.file_hashes[conllu_path] = file_hash(conllu_path)
+        return self.file_hashes[conllu_path]
+
+    # where the augmentations of conllu_path are stored for the current file contents and settings
+    def output_path(self, conllu_path: str) -> str:
+        key = hashlib.sha256(f'{self._relpath(conllu_path)}:{self._file_hash(conllu_path)}:{self.settings_hash}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{key}.{self.extension}')
+
+    # stored augmentations of conllu_path if neither the file nor the settings changed since they were made, else None
+    def lookup(self, conllu_path: str) -> str:
+        entry = self.manifest.get(self._relpath(conllu_path))
+        if entry is None or entry['file_hash'] != self._file_hash(conllu_path) or entry['settings_hash'] != self.settings_hash:
+            return None
+
+        output = os.path.join(self.cache_dir, entry['output'])
+        return output if os.path.exists(output) else None
+
+    # marks the augmentations of conllu_path as stored at output_path(conllu_path), and deletes the ones stored for its
+    # previous contents or settings, so changing a rule or the seed doesn't leave another copy of the corpus behind
+    def record(self, conllu_path: str):
+        relpath = self._relpath(conllu_path)
+        output = os.path.basename(self.output_path(conllu_path))
+        previous = self.manifest.get(relpath)
+        if previous is not None and previous['output'] != output:
+            try:
+                os.remove(os.path.join(self.cache_dir, previous['output']))
+            except FileNotFoundError:
+                pass
+
+        self.manifest[relpath] = {
+            'file_hash': self._file_hash(conllu_path),
+            'settings_hash': self.settings_hash,
+            'output': output,
+        }
+
+    # writes the manifest atomically, so an interrupted run never leaves a half-written one behind
+    def save(self):
+        manifest_path = os.path.join(self.cache_dir, MANIFEST)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=4, sort_keys=True)
+        os.replace(manifest_path + '.tmp', manifest_path)
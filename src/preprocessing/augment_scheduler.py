@@ -0,0 +1,266 @@
+# sentence-level work scheduler for the augmentors
+# every file is split into byte ranges of whole sentences (see conllu_io.chunk_offsets) and the chunks are handed out
+# to a ProcessPoolExecutor one at a time, so a single large file no longer holds up a whole batch while other cores sit idle
+# the augmentor is sent to each worker once, when the worker starts, and loads its model/tables there (init_worker)
+# each worker appends its augmentations to its own buffered shard file, so there is no lock and no per-sentence
+# open/close on the hot path; once a batch is done its pieces are merged from the shards in a fixed order and sent_ids
+# are renumbered, so the output is the same no matter which worker augmented which chunk
+# with a seed, every chunk draws from its own RNG (chunk_rng), so a run is byte-identical however many workers it uses
+# with a cache_dir, files that haven't changed since an earlier run with the same settings are not augmented again
+# (see augment_cache.py)
+# with docs_per_shard, the output is written as .spacy (DocBin) shards instead of CoNLL-U: each worker turns its
+# augmentations into Docs in memory (see conllu_docs.py), so there's no CoNLL-U file to read and parse again
+# an augmentor used here needs:
+#   data_dir and seed attributes
+#   init_worker(): one-time setup inside each worker process
+#   augment_chunk(conllu_path, start, end, rng) -> list[Sentence]: the augmentations for one chunk, in order
+#   cache_settings() -> dict: everything besides the input that affects the augmentations (rules, seed, ...)
+# and optionally a counters attribute (a collections.Counter, or None) and an augmentors list of sub-augmentors, whose
+# counters are counted in the workers and added up into the caller's counters (see augmentor_counters)
+import concurrent.futures as cf
+import glob
+import os
+import random
+import shutil
+import tempfile
+import traceback
+from collections import Counter
+from conllu_io import SENT_ID_PREFIX, chunk_offsets, format_sentence
+from augment_cache import AugmentCache
+from remove_comments import strip_comments
+
+# output files of the augmentors (ConlluAugmentor, ConlluAugmentorExactWords, AugmentationPipeline); never augmented again
+AUGMENTED_PREFIXES = ('1zbatch_', '1zbatchexact_', '1zbatchmulti_')
+
+# the augmentor and shard file owned by this worker process, set once by _init_worker
+_augmentor = None
+_shard = None
+_n_sents = None    # sentences per Doc when writing DocBins; None when writing CoNLL-U
+_strip_comments = False
+
+# the counters of augmentor and of its sub-augmentors (e.g. AugmentationPipeline.augmentors), in a fixed order; None
+# for the ones without counters
+def augmentor_counters(augmentor) -> list[Counter]:
+    counters = [getattr(augmentor, 'counters', None)]
+    for sub_augmentor in getattr(augmentor, 'augmentors', ()):
+        counters.extend(augmentor_counters(sub_augmentor))
+    return counters
+
+def _init_worker(augmentor, shard_dir: str, n_sents: int=None, strip_comments: bool=False):
+    global _augmentor, _shard, _n_sents, _strip_comments
+    _augmentor = augmentor
+    _augmentor.init_worker()
+    # start from zero; whatever the caller had counted before is still in its own copy
+    for counters in augmentor_counters(_augmentor):
+        if counters is not None:
+            counters.clear()
+    _n_sents = n_sents
+    _strip_comments = strip_comments
+    _shard = open(os.path.join(shard_dir, f'shard_{os.getpid()}.conllu'), 'wb', buffering=1 << 20)
+
+# the RNG for the chunk of conllu_path starting at byte offset start, derived only from the seed, the file's path
+# relative to data_dir, and the offset. the same corpus, seed and chunk_size always give the same draws
+# returns None without a seed, in which case the augmentor falls back to the global random module
+def chunk_rng(seed, data_dir: str, conllu_path: str, start: int=0) -> random.Random:
+    if seed is None:
+        return None
+    relpath = os.path.relpath(conllu_path, data_dir).replace(os.sep, '/')
+    return random.Random(f'{seed}:{relpath}:{start}')
+
+# augments one chunk into this worker's shard and returns where it went, (shard_path, offset, length), and what the
+# augmentor's counters counted for it (see augmentor_counters)
+# CoNLL-U sentences get a placeholder sent_id of 0; merge_segments renumbers them
+# DocBin output is written as one serialized DocBin per chunk
+def _augment_chunk(job: tuple[int, str, int, int]) -> tuple[tuple[str, int, int], list[Counter]]:
+    _, conllu_path, start, end = job
+    offset = _shard.tell()
+    rng = chunk_rng(_augmentor.seed, _augmentor.data_dir, conllu_path, start)
+    augmented = _augmentor.augment_chunk(conllu_path, start, end, rng)
+    if _strip_comments:
+        augmented = list(strip_comments(augmented))
+    if _n_sents is None:
+        for sentence in augmented:
+            _shard.write(format_sentence(sentence.rows, 0, sentence.comments).encode('utf-8'))
+    elif augmented:
+        from conllu_docs import docbin_bytes    # spaCy is only needed when writing DocBins
+        _shard.write(docbin_bytes(augmented, _n_sents))
+    _shard.flush()    # the parent reads this segment once the batch is done
+
+    deltas = []
+    for counters in augmentor_counters(_augmentor):
+        deltas.append(Counter(counters) if counters is not None else None)
+        if counters is not None:
+            counters.clear()
+    return (_shard.name, offset, _shard.tell() - offset), deltas
+
+# concatenates [(shard_path, offset, length), ...] into out_file in one streaming pass, numbering sent_ids from 0
+def merge_segments(out_file: str, segments: list[tuple[str, int, int]]):
+    count = 0
+    with open(out_file, 'wb', buffering=1 << 20) as out:
+        for shard_path, offset, length in segments:
+            with open(shard_path, 'rb') as shard:
+                shard.seek(offset)
+                remaining = length
+                while remaining > 0:
+                    line = shard.readline(remaining)
+                    remaining -= len(line)
+                    if line.startswith(SENT_ID_PREFIX.encode('utf-8')):
+                        line = f'{SENT_ID_PREFIX} {count}\n'.encode('utf-8')
+                        count += 1
+                    out.write(line)
+
+# groups the .conllu files in data_dir into batches of batch_size; a batch never spans two directories
+# files whose name starts with one of skip_prefixes (i.e. earlier augmentations) and hidden directories are left out
+# returns [(batch_number, [(directory, conllu_path), ...]), ...]
+def plan_batches(data_dir: str, batch_size: int, skip_prefixes: tuple[str]) -> list[tuple[int, list[tuple[str, str]]]]:
+    batches = []
+    counter = 0
+    for root, dirnames, filenames in os.walk(data_dir):
+        # sorted so batch numbers don't depend on the order the filesystem lists directories in
+        dirnames[:] = sorted(dirname for dirname in dirnames if not dirname.startswith('.'))
+        batch = []
+        for filename in sorted(filenames):
+            if filename.startswith(skip_prefixes) or not filename.endswith('conllu'):
+                continue
+
+            batch.append((root, os.path.join(root, filename)))
+
+            if len(batch) == batch_size:
+                batches.append((counter, batch))
+                counter += 1
+                batch = []
+
+        # add remaining files to last batch
+        if len(batch) != 0:
+            batches.append((counter, batch))
+            counter += 1
+    return batches
+
+# splits every file of every batch into jobs of roughly chunk_size bytes: [(batch_number, conllu_path, start, end), ...]
+# files in skip get no jobs
+def plan_chunks(batches: list[tuple[int, list[tuple[str, str]]]], chunk_size: int, skip=()) -> list[tuple[int, str, int, int]]:
+    jobs = []
+    for number, file_tuples in batches:
+        for _, conllu_path in file_tuples:
+            if conllu_path in skip:
+                continue
+            for start, end in chunk_offsets(conllu_path, chunk_size):
+                jobs.append((number, conllu_path, start, end))
+    return jobs
+
+# the whole of a file as a segment for merge_segments
+def _whole_file(path: str) -> tuple[str, int, int]:
+    return path, 0, os.path.getsize(path)
+
+# augments every batch and writes each one to {directory}/{out_prefix}{batch_number}_aug.conllu
+# a batch is merged from the shards as soon as all of its chunks are done, with its sentences in file and chunk order
+# shard_dir: where the per-worker shard files go (default: a temporary directory); they are deleted at the end
+# cache_dir: if given, reuse the augmentations of files that haven't changed since an earlier run with the same settings,
+#   and store the augmentations of every other file there for the next run
+# docs_per_shard: if given, write each batch as DocBins of docs_per_shard docs of n_sents sentences each instead, to
+#   {out_dir or directory}/{out_prefix}{batch_number}_{shard_number}.spacy
+#   a Doc never spans two chunks, so the last Doc of a chunk may have fewer sentences
+# strip_comments: drop the comment lines of the input from the output, as remove_comments.py would have, so the corpus
+#   doesn't have to be cleaned (and stored) first
+# what the workers count is added to the counters of augmentor (and its sub-augmentors) as their chunks finish
+def run_chunks(augmentor, batches: list[tuple[int, list[tuple[str, str]]]], out_prefix: str, chunk_size: int, max_workers: int=None, 
+               shard_dir: str=None, cache_dir: str=None, docs_per_shard: int=None, n_sents: int=10, out_dir: str=None, 
+               strip_comments: bool=False):
+    if docs_per_shard is None:
+        n_sents = None    # CoNLL-U output
+    else:
+        from conllu_docs import merge_docbin_segments, write_docbin_shards    # spaCy is only needed when writing DocBins
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+
+    cache = None
+    reused = {}    # conllu_path -> its stored augmentations from an earlier run
+    if cache_dir is not None:
+        settings = {**augmentor.cache_settings(), 'chunk_size': chunk_size}
+        if n_sents is not None:
+            settings['n_sents'] = n_sents
+        if strip_comments:
+            settings['strip_comments'] = True
+        cache = AugmentCache(cache_dir, augmentor.data_dir, settings, extension='conllu' if n_sents is None else 'spacy')
+        for _, file_tuples in batches:
+            for _, conllu_path in file_tuples:
+                cached = cache.lookup(conllu_path)
+                if cached is not None:
+                    reused[conllu_path] = cached
+        print(f'Reusing cached augmentations for {len(reused)} files')
+
+    counters_list = augmentor_counters(augmentor)
+    jobs = plan_chunks(batches, chunk_size, skip=reused)
+    file_tuples_by_batch = dict(batches)
+    remaining = Counter(job[0] for job in jobs)
+    finished = {number: {} for number in file_tuples_by_batch}    # batch_number -> {job_index: segment}
+    failed = set()    # files with a chunk that could not be augmented; never cached
+
+    # merges every file of a batch, in order, into the batch's output file
+    def finish_batch(number: int):
+        file_segments = {}
+        for index, segment in sorted(finished.pop(number).items()):
+            file_segments.setdefault(jobs[index][1], []).append(segment)
+
+        segments = []
+        for _, conllu_path in file_tuples_by_batch[number]:
+            if conllu_path in reused:
+                segments.append(_whole_file(reused[conllu_path]))
+            elif cache is not None and conllu_path not in failed:
+                cache_file = cache.output_path(conllu_path)
+                chunk_segments = [segment for segment in file_segments.get(conllu_path, []) if segment[2] > 0]
+                if n_sents is None:
+                    merge_segments(cache_file, chunk_segments)
+                else:
+                    merge_docbin_segments(chunk_segments).to_disk(cache_file)
+                cache.record(conllu_path)
+                segments.append(_whole_file(cache_file))
+            else:
+                segments.extend(file_segments.get(conllu_path, []))
+
+        directory = file_tuples_by_batch[number][0][0]
+        segments = [segment for segment in segments if segment[2] > 0]
+        if n_sents is None:
+            out_file = f'{directory}/{out_prefix}{number}_aug.conllu'
+            if segments:
+                merge_segments(out_file, segments)
+            elif os.path.exists(out_file):    # left over from an earlier run
+                os.remove(out_file)
+        else:
+            shard_prefix = os.path.join(out_dir or directory, f'{out_prefix}{number}_')
+            written = write_docbin_shards(shard_prefix, segments, docs_per_shard)
+            for path in glob.glob(glob.escape(shard_prefix) + '*.spacy'):
+                if path not in written:    # left over from an earlier run
+                    os.remove(path)
+
+        if cache is not None:
+            cache.save()
+        print(f'Batch {number} finished')
+
+    # batches made up entirely of reused files are done already
+    for number in file_tuples_by_batch:
+        if remaining[number] == 0:
+            finish_batch(number)
+
+    shard_dir = tempfile.mkdtemp(prefix='augment_shards_', dir=shard_dir)
+    try:
+        with cf.ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(augmentor, shard_dir, n_sents, strip_comments)) as executor:
+            futures = {executor.submit(_augment_chunk, job): index for index, job in enumerate(jobs)}
+            for future in cf.as_completed(futures):
+                index = futures[future]
+                number, conllu_path, start, end = jobs[index]
+                try:
+                    finished[number][index], deltas = future.result()
+                    for counters, delta in zip(counters_list, deltas):
+                        if counters is not None:
+                            counters.update(delta)
+                except Exception as e:
+                    failed.add(conllu_path)
+                    print(f'Error augmenting {conllu_path} [{start}:{end}]: {e}')
+                    traceback.print_exc()
+
+                remaining[number] -= 1
+                if remaining[number] == 0:
+                    finish_batch(number)
+    finally:
+        shutil.rmtree(shard_dir, ignore_errors=True)
@@ -0,0 +1,113 @@
+# runs several augmentors (e.g. ConlluAugmentor and ConlluAugmentorExactWords) over a corpus in one streaming pass
+# every sentence is read and parsed once and each augmentor gets k independent attempts at it, so getting more augmented
+# data no longer means running each augmentor over the whole corpus again
+import time
+import traceback
+from conllu_io import Sentence, read_conllu
+from augment_scheduler import AUGMENTED_PREFIXES, plan_batches, run_chunks
+from conllu_augmentor import ConlluAugmentor
+from conllu_augmentor import RULES as DEPENDENCY_RULES
+from conllu_augmentor_exact_words import ConlluAugmentorExactWords
+from conllu_augmentor_exact_words import RULES as EXACT_WORD_RULES
+from lexicon import open_lexicon
+
+class AugmentationPipeline:
+    '''Combines augmentors into a single pass that can produce several augmentations per sentence'''
+
+    # data_dir: directory containing .conllu files
+    # augmentors: augmentors with an augment(sentence, rng) method, e.g. ConlluAugmentor and ConlluAugmentorExactWords
+    # k: independent augmentation attempts per sentence, per augmentor; identical results are only kept once
+    # max_ratio: if given, the most augmented sentences to keep per clean sentence (e.g. 0.5 = at most one augmentation
+    #   for every two source sentences). this is a cap, not a target: nothing is added when the augmentors find fewer.
+    #   it is applied as each chunk streams by, counting from zero in every chunk, so kept augmentations are spread
+    #   evenly rather than bunched at the start and the whole output stays under it too; with a low cap, smaller
+    #   chunks (chunk_size) keep somewhat fewer. without it, every augmentation is kept
+    # seed: if given, augmentation is reproducible (see augment_scheduler.chunk_rng)
+    def __init__(self, data_dir: str, augmentors: list, k: int=1, max_ratio: float=None, seed=None):
+        self.data_dir = data_dir
+        self.augmentors = augmentors
+        self.k = k
+        self.max_ratio = max_ratio
+        self.seed = seed
+
+    # one-time setup in each worker process of the scheduler (see augment_scheduler.py)
+    def init_worker(self):
+        for augmentor in self.augmentors:
+            augmentor.init_worker()
+
+    # every distinct augmentation of sentence: up to k from each augmentor
+    def augment_all(self, sentence: Sentence, rng=None) -> list[Sentence]:
+        augmented = []
+        seen = set()
+        for augmentor in self.augmentors:
+            for _ in range(self.k):
+                aug_sentence = augmentor.augment(sentence, rng)
+                if aug_sentence and tuple(aug_sentence.rows) not in seen:
+                    seen.add(tuple(aug_sentence.rows))
+                    augmented.append(aug_sentence)
+        return augmented
+
+    # augmentations for the sentences of conllu_path between byte offsets start and end, in order
+    def augment_chunk(self, conllu_path: str, start: int, end: int, rng=None) -> list[Sentence]:
+        augmented = []
+        clean = 0
+        for sentence in read_conllu(conllu_path, start, end):
+            clean += 1
+            for aug_sentence in self.augment_all(sentence, rng):
+                # over max_ratio augmented:clean in this chunk so far; drop the rest of this sentence's augmentations
+                if self.max_ratio is not None and len(augmented) + 1 > self.max_ratio * clean:
+                    break
+                augmented.append(aug_sentence)
+        return augmented
+
+    # everything besides the input that affects the augmentations; used as part of the cache key (see augment_cache.py)
+    def cache_settings(self) -> dict:
+        return {
+            'augmentor': type(self).__name__,
+            'augmentors': [augmentor.cache_settings() for augmentor in self.augmentors],
+            'k': self.k,
+            'max_ratio': self.max_ratio,
+            'seed': self.seed,
+        }
+
+    # same as ConlluAugmentor.run, but every augmentor's augmentations of every {batch_size} files in the same directory
+    # are written to a single 1zbatchmulti_ file
+    # strip_comments: leave the input's comment lines out of the output (see remove_comments.py)
+    def run(self, batch_size: int=20, chunk_size: int=1 << 20, max_workers: int=None, cache_dir: str=None, strip_comments: bool=False):
+        try:
+            start = time.time()
+            batches = plan_batches(self.data_dir, batch_size, AUGMENTED_PREFIXES)
+            end = time.time()
+            print(f"Batching finished in {end-start} seconds")
+
+            start = time.time()
+            run_chunks(self, batches, '1zbatchmulti_', chunk_size, max_workers, cache_dir=cache_dir, strip_comments=strip_comments)
+            end = time.time()
+
+            print(f"Execution finished in {end-start} seconds")
+
+        except Exception as e:
+            print(f'Error augmenting dataset: {e}')
+            traceback.print_exc()
+
+def main():
+    data_dir = 'data/raw/gum_cleaned'
+
+    # memory-mapped, so every worker process shares one copy (see lexicon.py)
+    ADJECTIVE_TO_ADVERB = open_lexicon('src/adj_to_adv.txt')
+    ADVERB_TO_ADJECTIVE = open_lexicon('src/adv_to_adj.txt')
+
+    # both augmentors in one pass: up to 2 augmentations per sentence from each, at most 1 augmented per clean sentence
+    augmentors = [
+        ConlluAugmentor(data_dir, ADJECTIVE_TO_ADVERB, ADVERB_TO_ADJECTIVE, rules=DEPENDENCY_RULES),
+        ConlluAugmentorExactWords(data_dir, rules=EXACT_WORD_RULES),
+    ]
+    pipeline = AugmentationPipeline(data_dir, augmentors, k=2, max_ratio=1.0, seed=0)
+    start = time.time()
+
+    pipeline.run(batch_size=5)
+    end = time.time()
+    print(f"finished in {end-start} seconds")
+
+if __name__ == "__main__":
+    main()
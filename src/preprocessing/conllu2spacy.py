@@ -1,18 +1,22 @@
 # takes CoNLL-U formatted treebank from in_dir, converts to spaCy binary, and automatically splits into train and dev sets
 # this must be done in order to train a spaCy component
-# uses multithreading to convert multiple files at once
+# converts in-process (see conllu_docs.py) on a process pool, so there's no new interpreter and spaCy import per file
 import os
-from concurrent.futures import ThreadPoolExecutor
-from train_dev_split import TrainDevSplit
+import traceback
+import concurrent.futures as cf
+from sentence_split import SentenceSplit
+from augment_scheduler import AUGMENTED_PREFIXES
+from conllu_docs import convert_file
 
 class Conllu2Spacy:
-    FILE_TYPE = "spacy"
-    CONVERTER = "auto"
+    N_SENTS = 10    # sentences per Doc
     
-    def __init__(self, in_dir, out_dir, format):
+    # max_workers: processes converting files at once (default: number of cores)
+    def __init__(self, in_dir, out_dir, format, max_workers=None):
         self.in_dir = in_dir
         self.out_dir = out_dir
         self.format = format
+        self.max_workers = max_workers
     
     # Checks for 'format' files in 'in_dir' 
     # returns list of files 
@@ -24,34 +28,44 @@ class Conllu2Spacy:
                     files.append(os.path.join(root, file))
         return files
 
-    # Runs the conversion command for each file in 'in_dir'
+    # Converts each file in 'in_dir' on a process pool
+    # returns {file: error} for every file that could not be converted
     def __run_conversion__(self):
         print("Converting: \n")
 
-        base_command = "python -m spacy convert"
-        command_list = []
-        list_of_files = self.__check_dir__()
-
-        for file in list_of_files:
+        files = []
+        for file in self.__check_dir__():
             filename = os.path.basename(file)
-            if filename.startswith("zbatch_") or filename.startswith("1zbatch_") or filename.startswith('1zbatchexact_'):
+            if filename.startswith("zbatch_") or filename.startswith(AUGMENTED_PREFIXES):
                 print("\t" + file)
-                command = base_command + f" {file} {self.out_dir} --converter {self.CONVERTER} --file-type {self.FILE_TYPE} -n 10"
-                command_list.append(command)
+                files.append(file)
             
         print() 
 
-        with ThreadPoolExecutor() as executor:
-            results = executor.map(os.system, command_list)
-
-        for result in results:
-            if result != 0:
-                print(f"Command failed with exit code {result}")
+        os.makedirs(self.out_dir, exist_ok=True)
+        failures = {}
+        with cf.ProcessPoolExecutor(self.max_workers) as executor:
+            futures = {executor.submit(convert_file, file, self.out_dir, self.N_SENTS): file for file in files}
+            for future in cf.as_completed(futures):
+                file = futures[future]
+                try:
+                    out_path, n_docs = future.result()
+                    print(f"\t{file} -> {out_path} ({n_docs} docs)")
+                except Exception as e:
+                    failures[file] = e
+                    print(f"Error converting {file}: {e}")
+                    traceback.print_exc()
 
-        print("Conversion Successful.\n")
+        if failures:
+            print(f"Conversion failed for {len(failures)} of {len(files)} files:")
+            for file, e in failures.items():
+                print(f"\t{file}: {e}")
+        else:
+            print("Conversion Successful.\n")
+        return failures
         
     def run(self): 
-        self.__run_conversion__()
+        return self.__run_conversion__()
 
 def main():
     in_dir = r"data/raw/gum_cleaned"
@@ -59,8 +73,8 @@ def main():
     c2s = Conllu2Spacy(in_dir, out_dir, 'conllu')
     c2s.run()
 
-    tds = TrainDevSplit(out_dir, 0.2)
-    tds.split()
+    ss = SentenceSplit(out_dir, out_dir, {'train': 0.8, 'dev': 0.2})
+    ss.split()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -9,17 +9,34 @@
 
 # note that i previously used a fork of word_forms (https://github.com/skarokin/word_forms_threadsafe) to generate 
 # different forms of words, but later found lemminflect (faster) and used a rule-based map of adj<->adv 
-import spacy
-import lemminflect
+# spacy and lemminflect are only imported once they're actually needed (see load_nlp), which keeps startup fast for runs
+# that never touch them, e.g. with use_gold_lemma
+import hashlib
 import json
-import copy
 import random
-import os
-import concurrent.futures as cf
-from threading import Thread
-from threading import Lock
 import time
 import traceback
+import logging
+from typing import Iterator
+from conllu_io import Sentence, read_conllu
+from augment_scheduler import AUGMENTED_PREFIXES, plan_batches, run_chunks
+from augment_cache import file_hash
+from lexicon import Lexicon, open_lexicon
+
+logger = logging.getLogger(__name__)
+
+# the pipeline loaded when neither model nor nlp is given
+DEFAULT_MODEL = 'en_core_web_sm'
+
+# the pipeline only ever tags single words, so these components are not loaded at all
+UNUSED_COMPONENTS = ['parser', 'ner', 'lemmatizer']
+
+# content hash of an adjective/adverb map for the cache key; a Lexicon's compiled file is hashed as it is, without 
+# reading it back into a dict
+def map_hash(mapping) -> str:
+    if isinstance(mapping, Lexicon):
+        return file_hash(mapping.lex_path)
+    return hashlib.sha256(json.dumps(mapping, sort_keys=True).encode('utf-8')).hexdigest()
 
 # mapping to automatically update POS if the new tag falls under a different POS category
 # (thanks Pranshu for idea) this is only necessary for adjective <-> adverb but added extra just for completeness
@@ -64,201 +81,245 @@ class ConlluAugmentor:
     # - old_tag and child work together; if child is True, then old_tag is the tag of the child to change to aug_tag
     #   if child is False, then old_tag is the tag of the head to change to aug_tag
     #   if feat is not empty, change the morph feats
-    def __init__(self, data_dir: str, ADJECTIVE_TO_ADVERB, ADVERB_TO_ADJECTIVE, rules: list[tuple[any]]=None, model: str='en_core_web_sm'):
+    # counters: optional collections.Counter; records 'found' and 'not_found' (whether a suggestion was found), 
+    #   'adj_to_adv_lookups' and 'adv_to_adj_lookups' without any I/O. run() adds up what its worker processes count
+    # seed: if given, augmentation is reproducible; run() gives every chunk its own RNG derived from the seed and the 
+    #   file path (see augment_scheduler.chunk_rng) and augment_sentence otherwise draws from a random.Random(seed)
+    # use_gold_lemma: inflect from the lemma column of the CoNLL-U file with a cached (lemma, tag) -> form table instead
+    #   of running the spaCy pipeline on every candidate word; spaCy is then never loaded
+    # model: spaCy pipeline to load, on first use (see load_nlp); DEFAULT_MODEL unless nlp is given
+    # nlp: an already loaded pipeline to use instead; it is pickled along to worker processes. model, if also given, 
+    #   only names it in the cache key
+    # exclude: components of model not to load
+    def __init__(self, data_dir: str, ADJECTIVE_TO_ADVERB, ADVERB_TO_ADJECTIVE, rules: list[tuple[any]]=None, model: str=None, 
+                 counters=None, seed=None, use_gold_lemma: bool=False, nlp=None, exclude: list[str]=UNUSED_COMPONENTS):
         self.data_dir = data_dir
         self.rules = rules
-        self.nlp = spacy.load(model)
+        self.model = model if model is not None or nlp is not None else DEFAULT_MODEL
+        self.nlp = nlp
+        self.loaded_nlp = False    # whether self.nlp was loaded from self.model by load_nlp
+        self.exclude = exclude
         self.ADJECTIVE_TO_ADVERB = ADJECTIVE_TO_ADVERB
         self.ADVERB_TO_ADJECTIVE = ADVERB_TO_ADJECTIVE
+        self.counters = counters
+        self.seed = seed
+        self.rng = random.Random(seed) if seed is not None else None
+        self.use_gold_lemma = use_gold_lemma
+        self.form_table = {}    # (lemma, tag) -> form, or None if lemminflect has no such form
+        self.compile_rules()
+
+    # builds the rule table used by augment_sentence: the rules with their POS/tag lists turned into sets,
+    # and a lookup from dep_rel to the indices of the rules that use it
+    def compile_rules(self):
+        self.compiled_rules = []
+        self.rules_by_dep = {}
+        for index, (dep_rel, child_pos_list, head_pos_list, old_tag_list, aug_tag, child, aug_feat, probability) in enumerate(self.rules or []):
+            self.compiled_rules.append((frozenset(child_pos_list), frozenset(head_pos_list), frozenset(old_tag_list), aug_tag, child, aug_feat, probability))
+            self.rules_by_dep.setdefault(dep_rel, []).append(index)
+
+    def _count(self, key: str):
+        if self.counters is not None:
+            self.counters[key] += 1
 
     def add_rule(self, rule: tuple[any]):
         if (rule[0], rule[1], rule[2], rule[3], rule[4], rule[5]) in self.rules:
             return
 
         self.rules.append(rule)
+        self.compile_rules()
+
+    # {tag} form of a gold lemma, memoized in form_table; each worker process fills its own as it goes, since a 
+    # lemminflect lookup is cheap and reading the whole corpus up front to warm it is not
+    def inflect_lemma(self, lemma: str, tag: str) -> str:
+        key = (lemma, tag)
+        if key not in self.form_table:
+            import lemminflect
+            forms = lemminflect.getInflection(lemma, tag=tag)
+            self.form_table[key] = forms[0].lower() if forms else None
+        return self.form_table[key]
 
     def get_forms(self, word: str, lemma: str, tag: str, nlp) -> str:
-        lemma = nlp(word)[0]._.lemma()
+        if not self.use_gold_lemma:
+            lemma = nlp(word)[0]._.lemma()
+        elif lemma == '_':    # no gold lemma in this file
+            lemma = word.lower()
         word = word.lower()
         
         if tag in ['RB', 'RBR', 'RBS']:
+            self._count('adj_to_adv_lookups')
             if word in self.ADJECTIVE_TO_ADVERB:
                 form = self.ADJECTIVE_TO_ADVERB[word].lower()
                 if form != word:
-                    print(f'Found {tag} form for {word}: {form}')
+                    logger.debug('Found %s form for %s: %s', tag, word, form)
+                    self._count('found')
                     return form
+            self._count('not_found')
             return None
         elif tag in ['JJ', 'JJR', 'JJS']:
+            self._count('adv_to_adj_lookups')
             if word in self.ADVERB_TO_ADJECTIVE:
                 form = self.ADVERB_TO_ADJECTIVE[word].lower()
                 if form != word:
-                    print(f'Found {tag} form for {word}: {form}')
+                    logger.debug('Found %s form for %s: %s', tag, word, form)
+                    self._count('found')
                     return form
+                self._count('not_found')
                 return None
         
-        form = nlp(lemma)[0]._.inflect(tag).lower()
-        if form != word:
-            print(f'Found {tag} form for {word}: {form}')
+        if self.use_gold_lemma:
+            form = self.inflect_lemma(lemma, tag)
+        else:
+            form = nlp(lemma)[0]._.inflect(tag).lower()
+        if form and form != word:
+            logger.debug('Found %s form for %s: %s', tag, word, form)
+            self._count('found')
             return form
     
-        print(f'Could not find {tag} form for: {word}')
+        logger.debug('Could not find %s form for: %s', tag, word)
+        self._count('not_found')
         return None
             
-    # format string of conllu data into a list of sentences, where each sentence is a list of words with all features
-    @staticmethod
-    def format_data(data: str) -> list[list[str]]:
-        data = data.split('# sent_id =')[1:]
-        splitted_data = ['' for _ in range(len(data))]
-
-        for item in data:
-            item_split = item.split('\n', 1)
-            sent_id = int(item_split[0])
-            lines = item_split[1].split('\n')
-            split_lines = [line.split('\t') for line in lines if line.strip()]  # split by tab, ignore extraneous lines
-            splitted_data[sent_id] = split_lines
-        
-        return splitted_data
-    
-    # reverses the sentence back to CoNLL-U format, assigning a new sent_id
-    @staticmethod
-    def reverse_format_data(sentence: list[list[str]], sent_id: int) -> str:
-        lines = ['\t'.join(word) for word in sentence]
-        return f'# sent_id = {sent_id}\n' + '\n'.join(lines) + '\n\n'
-
-    # open .conllu file and return formatted data
-    def open_conllu_file(self, conllu_path: str) -> list[list[str]]:
+    # open .conllu file and return a generator over its sentences
+    def open_conllu_file(self, conllu_path: str) -> Iterator[Sentence]:
         if not conllu_path.endswith('.conllu'):
             return None
         
-        with open(conllu_path, 'r', encoding='utf-8') as f:
-            data = f.read()
-        
-        return self.format_data(data)
+        return read_conllu(conllu_path)
 
     # augments a sentence with the first random rule that matches the sentence
-    # if no rule matches, return empty list. else, return the augmented sentence
+    # if no rule matches, return None. else, return the augmented sentence
     # automatically updates POS if the new tag falls under a different POS category
-    def augment_sentence(self, sentence: list[str], nlp) -> list[str]:
-        shuffled_rules = random.sample(self.rules, len(self.rules))
-        aug_sentence = copy.deepcopy(sentence)
-
-        for rule in shuffled_rules:
-            dep_rel, child_pos_list, head_pos_list, old_tag_list, aug_tag, child, aug_feat, probability = rule
-            for index, word in enumerate(aug_sentence):
-                # word matches dependency relation, child pos, and head pos
-                if word[7] == dep_rel and word[3] in child_pos_list and sentence[int(word[6])-1][3] in head_pos_list and random.uniform(0, 1) < probability: 
-                        # update tag of child if child is True and child tag is in old_tag_list
-                        if child and sentence[index][4] in old_tag_list:
-                            new_form = self.get_forms(word[1], word[2], aug_tag, nlp)
-                            if new_form:
-                                aug_sentence[index][4] = aug_tag
-                                aug_sentence[index][1] = new_form
-                                aug_sentence[index][3] = tag_to_pos[aug_tag]
-                                if aug_feat:
-                                    aug_sentence[index][5] = aug_feat
-                            else:
-                                return []
-                        # update tag of head if child is False and head exists and head tag is in old_tag_list
-                        elif int(word[6]) > 0 and sentence[int(word[6])-1][4] in old_tag_list:
-                            head_index = int(word[6]) - 1    # words are 1-indexed in CoNLL-U format
-                            new_form = self.get_forms(sentence[head_index][1], sentence[head_index][2], aug_tag, nlp)
-                            if new_form:
-                                aug_sentence[head_index][4] = aug_tag 
-                                aug_sentence[head_index][1] = new_form
-                                aug_sentence[head_index][3] = tag_to_pos[aug_tag]
-                                if aug_feat:
-                                    aug_sentence[head_index][5] = aug_feat
-                            else:
-                                return []
-                        else:
-                            continue    
-                        
-                        return aug_sentence 
+    # nothing is copied until a rule actually fires; then only the changed token is rebuilt (see Sentence.edit)
+    # rng: random.Random to draw from; defaults to the seeded one from __init__, or the global random module
+    def augment_sentence(self, sentence: Sentence, nlp, rng=None) -> Sentence:
+        rng = rng or self.rng or random
+        words = sentence.words()
+
+        # single pass over the words: for each rule, the positions of the words matching its dep_rel, child pos, and head pos
+        candidates = {}
+        for index, word in enumerate(words):
+            rule_indices = self.rules_by_dep.get(word.deprel)
+            if rule_indices is None:
+                continue
+            head_pos = words[int(word.head)-1].upos
+            for rule_index in rule_indices:
+                child_pos_set, head_pos_set = self.compiled_rules[rule_index][:2]
+                if word.upos in child_pos_set and head_pos in head_pos_set:
+                    candidates.setdefault(rule_index, []).append(index)
+
         # no rules matched for this sentence 
-        return []
+        if not candidates:
+            return None
+
+        # same draws, in the same order, as trying every rule in random order against every word
+        for rule_index in rng.sample(range(len(self.compiled_rules)), len(self.compiled_rules)):
+            _, _, old_tag_set, aug_tag, child, aug_feat, probability = self.compiled_rules[rule_index]
+            for index in candidates.get(rule_index, ()):
+                if rng.random() < probability:
+                    word = words[index]
+                    # update tag of child if child is True and child tag is in old_tag_list
+                    if child and word.xpos in old_tag_set:
+                        target_index = index
+                    # update tag of head if child is False and head exists and head tag is in old_tag_list
+                    elif int(word.head) > 0 and words[int(word.head)-1].xpos in old_tag_set:
+                        target_index = int(word.head) - 1    # words are 1-indexed in CoNLL-U format
+                    else:
+                        continue    
+
+                    target = words[target_index]
+                    new_form = self.get_forms(target.form, target.lemma, aug_tag, nlp)
+                    if not new_form:
+                        return None
 
-    # run augment_sentence on an entire .conllu file
-    # creates a new .conllu file with the augmented data and appends it to the data directory
-    def augment_conllu_file(self, conllu_path: str, out_file: str, counter: list[int], lock: Lock, counter_lock: Lock, nlp):
+                    aug_token = target._replace(form=new_form, upos=tag_to_pos[aug_tag], xpos=aug_tag, feats=aug_feat or target.feats)
+                    return sentence.edit({target_index: aug_token})
+        # no candidate passed its probability check
+        return None
+
+    # the spaCy pipeline, loaded on first use (None with use_gold_lemma, which never needs it)
+    def load_nlp(self):
+        if self.nlp is None and self.model and not self.use_gold_lemma:
+            import spacy
+            self.nlp = spacy.load(self.model, exclude=self.exclude)
+            self.loaded_nlp = True
+        if self.nlp is not None:
+            import lemminflect    # registers the ._.lemma() and ._.inflect() extensions get_forms calls
+        return self.nlp
+
+    # a pipeline load_nlp loaded is not pickled when this augmentor is sent to a worker process; init_worker loads the
+    # same one there. a pipeline given as nlp is pickled along, since model may not be where it came from
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.loaded_nlp:
+            state['nlp'] = None
+            state['loaded_nlp'] = False
+        return state
+
+    # names the pipeline for the cache key: model, or the name and version of a pipeline given as nlp
+    def model_name(self) -> str:
+        if self.model or self.nlp is None:
+            return self.model
+        meta = self.nlp.meta
+        return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}"
+
+    # one-time setup in each worker process of the scheduler (see augment_scheduler.py)
+    def init_worker(self):
+        self.load_nlp()
+
+    # augment_sentence with this augmentor's own resources; the same call for every augmentor (see augmentation_pipeline.py)
+    def augment(self, sentence: Sentence, rng=None) -> Sentence:
+        return self.augment_sentence(sentence, self.load_nlp(), rng)
+
+    # augmentations for the sentences of conllu_path between byte offsets start and end, in order
+    def augment_chunk(self, conllu_path: str, start: int, end: int, rng=None) -> list[Sentence]:
         if self.rules is None:
             raise ValueError('No rules specified for augmentation, aborting...')
 
-        formatted_data = self.open_conllu_file(conllu_path)
-        print(f'Augmenting {conllu_path}...')
-
-        # augment each sentence in the file then output to a new file 
-        # lock ensures that only one thread writes to the file or increments counter at a time
-        # all files in the same batch will write augmentations to the same file 
-        for sentence in formatted_data:
-            aug_sentence = self.augment_sentence(sentence, nlp)
-            if aug_sentence != []:
-                with lock:
-                    with open(out_file, 'a', encoding='utf-8') as file:
-                        file.write(f'{self.reverse_format_data(aug_sentence, counter[0])}')
-                with counter_lock:
-                    counter[0] += 1 # increment counter; remember that counter is a list because int is immutable
-
-    # augments {batch_size} files concurrently (python fake concurrency but this is still significantly faster)
-    # writes the augmentations of each file within a batch to a single file (may need to change if batch size is too large)
-    def run_batch(self, batch_info: tuple[int, list[tuple[str, str]]], nlp):
-        number, file_tuples = batch_info
-
-        print(f"Running batch {number}")
-
-        lock = Lock()
-        counter_lock = Lock()
-        counter = [0]    # hack to ensure counter is passed by reference
-        threads = []
-        out_file = f'{file_tuples[0][0]}/1zbatch_{number}_aug.conllu'
-
-        threads = [Thread(target=self.augment_conllu_file, args=(file_tuple[1], out_file, counter, lock, counter_lock, nlp)) for file_tuple in file_tuples]
-
-        for thread in threads:
-            thread.start()
-        
-        start_time = time.time()
+        augmented = []
+        for sentence in read_conllu(conllu_path, start, end):
+            aug_sentence = self.augment(sentence, rng)
+            if aug_sentence:
+                augmented.append(aug_sentence)
+        return augmented
 
-        for thread in threads:
-            thread.join()
-        
-        end_time = time.time()
+    # everything besides the input that affects the augmentations; used as part of the cache key (see augment_cache.py)
+    def cache_settings(self) -> dict:
+        settings = {
+            'augmentor': type(self).__name__,
+            'rules': self.rules,
+            'seed': self.seed,
+            'model': self.model_name(),
+            'use_gold_lemma': self.use_gold_lemma,
+            'ADJECTIVE_TO_ADVERB': map_hash(self.ADJECTIVE_TO_ADVERB),
+            'ADVERB_TO_ADJECTIVE': map_hash(self.ADVERB_TO_ADJECTIVE),
+        }
+        if self.exclude != UNUSED_COMPONENTS:
+            settings['exclude'] = self.exclude
+        return settings
 
-        print(f"Batch {number} finished in {end_time-start_time} seconds")
+    # splits the corpus into chunks of roughly chunk_size bytes of whole sentences and augments them on a process pool
+    # of max_workers (default: number of cores), handing out chunks as workers free up
+    # cache_dir: if given, files that haven't changed since an earlier run with the same settings are not augmented again
+    # the augmentations of every {batch_size} files in the same directory are written to a single 1zbatch_ file
+    # output: 'conllu', or 'spacy' to skip the CoNLL-U files and write the augmentations of each batch straight to .spacy
+    #   (DocBin) shards of docs_per_shard docs of n_sents sentences each, in out_dir (default: next to the input files)
+    #   ready for training; use 'conllu' when you want to read the augmentations
+    # strip_comments: leave the input's comment lines out of the output (see remove_comments.py)
+    def run(self, batch_size: int=20, chunk_size: int=1 << 20, max_workers: int=None, cache_dir: str=None, output: str='conllu',
+            out_dir: str=None, docs_per_shard: int=1000, n_sents: int=10, strip_comments: bool=False):
+        if output not in ('conllu', 'spacy'):
+            raise ValueError(f'Unknown output format {output}, expected conllu or spacy')
 
-    # processes {num cores in machine} batches in parallel
-    def run(self, batch_size: int=20):
         try:
             start = time.time()
-            batches = []
-            counter = 0
-            for root, _, filenames in os.walk(self.data_dir):
-                # ensure that batches stay within the same directory
-                batch = []
-                
-                for filename in filenames:
-                    if filename.startswith('1zbatch_') or filename.startswith('1zbatchexact_') or not filename.endswith('conllu'): 
-                        continue
-
-                    f = (root, os.path.join(root, filename))
-                    batch.append(f)
-
-                    if len(batch) == batch_size:
-                        batches.append((counter, batch))
-                        counter += 1
-                        batch = []
-
-                # add remaining files to last batch
-                if len(batch) != 0: 
-                    batches.append((counter, batch)) 
-
+            batches = plan_batches(self.data_dir, batch_size, AUGMENTED_PREFIXES)
             end = time.time()
             print(f"Batching finished in {end-start} seconds")
 
             start = time.time()
-
-            with cf.ProcessPoolExecutor() as executor:
-                executor.map(self.run_batch, batches, [self.nlp]*len(batches))
-            
+            run_chunks(self, batches, '1zbatch_', chunk_size, max_workers, cache_dir=cache_dir, 
+                       docs_per_shard=docs_per_shard if output == 'spacy' else None, n_sents=n_sents, out_dir=out_dir, 
+                       strip_comments=strip_comments)
             end = time.time()
 
             print(f"Execution finished in {end-start} seconds")
@@ -267,36 +328,35 @@ class ConlluAugmentor:
             print(f'Error augmenting dataset: {e}')
             traceback.print_exc()
 
+# 1. change gerunds and past tense verbs to base form verbs
+# 2. change plural verbs to singular and vice versa
+# 3. change adjectives to adverbs and vice versa
+# 4. change base form verbs after modals to gerunds
+# 5. change base form verbs after modal to past tense verbs 
+# 6. change gerunds after prepositions to base form verbs
+# 7. change 'is' to 'are'
+RULES = [('nsubj', ['NOUN', 'PROPN'], ['VERB'], ['VBD', 'VBG'], 'VB', False, '', 0.25),  
+         ('nsubj', ['NOUN', 'PROPN'], ['VERB'], ['VBZ', 'VBD'], 'VBP', True, '', 0.25),
+         ('nsubj', ['NOUN', 'PROPN'], ['VERB'], ['VBP', 'VBD'], 'VBZ', True, '', 0.25),
+         ('advmod', ['ADV'], ['VERB'], ['RB'], 'JJ', True, '', 0.45),
+         ('amod', ['ADJ'], ['NOUN'], ['JJ'], 'RB', True, '', 0.30),  
+         ('aux', ['AUX'], ['VERB'], ['VB'], 'VBG', False, '', 0.30),
+         ('aux', ['AUX'], ['VERB'], ['VB'], 'VBD', False, '', 0.30),
+         ('case', ['ADP'], ['VERB'], ['VBG'], 'VB', False, '', 0.60),
+         ('cop', ['AUX'], ['VERB', 'ADJ', 'ADV'], ['VBZ'], 'VBP', True, 'Mood=Ind|Number=Sing|Person=1|Tense=Pres|VerbForm=Fin', 0.30),
+         ('cop', ['AUX'], ['VERB', 'ADJ', 'ADV'], ['VB', 'VBP'], 'VBZ', True, 'Mood=Ind|Number=Sing|Person=3|Tense=Pres|VerbForm=Fin', 0.30),
+         ('cop', ['AUX'], ['VERB', 'ADJ', 'ADV'], ['VB', 'VBZ', 'VBP'], 'VBD', True, 'Mood=Ind|Number=Sing|Person=3|Tense=Past|VerbForm=Fin', 0.30),
+         ('cop', ['AUX'], ['VERB', 'ADJ', 'ADV'], ['VB', 'VBD'], 'VBG', True, 'Tense=Pres|VerbForm=Part', 0.30),
+        ]
+
 def main():
     data_dir = 'data/raw/gum_cleaned'
 
-    # 1. change gerunds and past tense verbs to base form verbs
-    # 2. change plural verbs to singular and vice versa
-    # 3. change adjectives to adverbs and vice versa
-    # 4. change base form verbs after modals to gerunds
-    # 5. change base form verbs after modal to past tense verbs 
-    # 6. change gerunds after prepositions to base form verbs
-    # 7. change 'is' to 'are'
-    rules = [('nsubj', ['NOUN', 'PROPN'], ['VERB'], ['VBD', 'VBG'], 'VB', False, '', 0.25),  
-             ('nsubj', ['NOUN', 'PROPN'], ['VERB'], ['VBZ', 'VBD'], 'VBP', True, '', 0.25),
-             ('nsubj', ['NOUN', 'PROPN'], ['VERB'], ['VBP', 'VBD'], 'VBZ', True, '', 0.25),
-             ('advmod', ['ADV'], ['VERB'], ['RB'], 'JJ', True, '', 0.45),
-             ('amod', ['ADJ'], ['NOUN'], ['JJ'], 'RB', True, '', 0.30),  
-             ('aux', ['AUX'], ['VERB'], ['VB'], 'VBG', False, '', 0.30),
-             ('aux', ['AUX'], ['VERB'], ['VB'], 'VBD', False, '', 0.30),
-             ('case', ['ADP'], ['VERB'], ['VBG'], 'VB', False, '', 0.60),
-             ('cop', ['AUX'], ['VERB', 'ADJ', 'ADV'], ['VBZ'], 'VBP', True, 'Mood=Ind|Number=Sing|Person=1|Tense=Pres|VerbForm=Fin', 0.30),
-             ('cop', ['AUX'], ['VERB', 'ADJ', 'ADV'], ['VB', 'VBP'], 'VBZ', True, 'Mood=Ind|Number=Sing|Person=3|Tense=Pres|VerbForm=Fin', 0.30),
-             ('cop', ['AUX'], ['VERB', 'ADJ', 'ADV'], ['VB', 'VBZ', 'VBP'], 'VBD', True, 'Mood=Ind|Number=Sing|Person=3|Tense=Past|VerbForm=Fin', 0.30),
-             ('cop', ['AUX'], ['VERB', 'ADJ', 'ADV'], ['VB', 'VBD'], 'VBG', True, 'Tense=Pres|VerbForm=Part', 0.30),
-            ]
-    
-    with open('src/adj_to_adv.txt', 'r') as f:
-        ADJECTIVE_TO_ADVERB = json.load(f)
-    with open('src/adv_to_adj.txt', 'r') as f:
-        ADVERB_TO_ADJECTIVE = json.load(f)
+    # memory-mapped, so every worker process shares one copy (see lexicon.py)
+    ADJECTIVE_TO_ADVERB = open_lexicon('src/adj_to_adv.txt')
+    ADVERB_TO_ADJECTIVE = open_lexicon('src/adv_to_adj.txt')
     
-    ca = ConlluAugmentor(data_dir, ADJECTIVE_TO_ADVERB, ADVERB_TO_ADJECTIVE, rules=rules)
+    ca = ConlluAugmentor(data_dir, ADJECTIVE_TO_ADVERB, ADVERB_TO_ADJECTIVE, rules=RULES)
     start = time.time()
     
     ca.run(batch_size=5)
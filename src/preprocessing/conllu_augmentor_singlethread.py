@@ -1,8 +1,9 @@
 from word_forms.word_forms import get_word_forms
 import spacy
-import copy
 import random
 import os
+from typing import Iterator
+from conllu_io import Sentence, Token, format_sentence, read_conllu
 
 # the single-threaded version of ConlluAugmentor. I highly recommend using the multi-threaded version
 # because this class is both unoptimized and also unfinished. If you want to use this class, you will need
@@ -33,21 +34,6 @@ class ConlluAugmentorSingleThread:
         print('could not find form for', word, tag)
         return None
             
-    # format string of conllu data into a list of sentences, where each sentence is a list of words with all features
-    @staticmethod
-    def format_data(data: str) -> list[list[str]]:
-        data = data.split('# sent_id =')[1:]
-        splitted_data = ['' for _ in range(len(data))]
-
-        for item in data:
-            item_split = item.split('\n', 1)
-            sent_id = int(item_split[0])
-            lines = item_split[1].split('\n')
-            split_lines = [line.split('\t') for line in lines if line.strip()]  # split by tab, ignore extraneous lines
-            splitted_data[sent_id] = split_lines
-        
-        return splitted_data
-    
     # add a rule to list of rules
     def add_rule(self, rule: tuple[any]):
         # if dep_rel, pos, aug_tag already exists, this is a duplicate rule
@@ -56,20 +42,18 @@ class ConlluAugmentorSingleThread:
 
         self.rules.append(rule)
 
-    # open .conllu file and return formatted data
-    def open_conllu_file(self, conllu_path: str) -> list[list[str]]:
+    # open .conllu file and return a generator over its sentences
+    def open_conllu_file(self, conllu_path: str) -> Iterator[Sentence]:
         if not conllu_path.endswith('.conllu'):
             return None
         
-        with open(conllu_path, 'r') as f:
-            data = f.read()
-        
-        return self.format_data(data)
+        return read_conllu(conllu_path)
 
     # returns augmented sentence
-    def augment_sentence(self, sentence: list[str]) -> list[str]:
+    # tokens are immutable, so the sentence is only shallow-copied and the changed token is replaced
+    def augment_sentence(self, sentence: list[Token]) -> list[Token]:
         shuffled_rules = random.sample(self.rules, len(self.rules))
-        aug_sentence = copy.deepcopy(sentence)
+        aug_sentence = list(sentence)
 
         for rule in shuffled_rules:
             dep_rel, child_pos_list, head_pos_list, old_tag_list, aug_tag, child, probability = rule
@@ -80,8 +64,7 @@ class ConlluAugmentorSingleThread:
                         if child and sentence[index][4] in old_tag_list:
                             new_form = self.get_forms(word[2], aug_tag)
                             if new_form:
-                                aug_sentence[index][4] = aug_tag
-                                aug_sentence[index][1] = new_form
+                                aug_sentence[index] = word._replace(xpos=aug_tag, form=new_form)
                             else:
                                 return []    # no augmentation possible
                         # update tag of head
@@ -89,8 +72,7 @@ class ConlluAugmentorSingleThread:
                             head_index = int(word[6]) - 1    # because head is 1-indexed
                             new_form = self.get_forms(sentence[head_index][2], aug_tag)
                             if new_form:
-                                aug_sentence[head_index][4] = aug_tag 
-                                aug_sentence[head_index][1] = new_form
+                                aug_sentence[head_index] = sentence[head_index]._replace(xpos=aug_tag, form=new_form)
                             else:
                                 return []    # no augmentation possible
                         else:
@@ -107,16 +89,13 @@ class ConlluAugmentorSingleThread:
         if self.rules is None:
             raise ValueError('No rules specified for augmentation, aborting...')
 
-        formatted_data = self.open_conllu_file(conllu_path)
-        aug_formatted_data = copy.deepcopy(formatted_data)
         count = 0
 
-        for sentence in formatted_data:
-            aug_sentence = self.augment_sentence(sentence)
+        for sentence in self.open_conllu_file(conllu_path):
+            aug_sentence = self.augment_sentence(sentence.words())
                 
             if len(aug_sentence) > 0:
-                aug_formatted_data.append(aug_sentence)
-                final_string = '# sent_id = ' + str(count) +'\n' + '\n'.join(['\t'.join(word) for word in aug_sentence])
+                final_string = format_sentence(aug_sentence, count)
                 print(final_string)    # temp; must output to new file later
                 count += 1
 
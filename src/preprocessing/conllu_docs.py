@@ -0,0 +1,105 @@
+# builds spaCy Docs straight from parsed CoNLL-U sentences (see conllu_io.py) and writes them as DocBin (.spacy) files
+# same annotation as `python -m spacy convert <file> <out_dir> --converter conllu -n 10`, but in-process: no new
+# interpreter and spaCy import per file, and no intermediate per-sentence Docs merged with Doc.from_docs
+# NER tags in the MISC column are not read; none of the components we train use them
+import os
+from typing import Iterable, Iterator
+from spacy.tokens import Doc, DocBin
+from spacy.vocab import Vocab
+from conllu_io import Sentence, read_conllu
+
+# one Doc out of several sentences; like Doc.from_docs, a space is added after the last token of every sentence but
+# the last if it had none, so the sentences don't run together in the Doc's text
+def sentences_to_doc(vocab: Vocab, sentences: list[Sentence]) -> Doc:
+    words, spaces, tags, poses, morphs, lemmas, heads, deps = [], [], [], [], [], [], [], []
+    sentence_ends = []
+    for sentence in sentences:
+        offset = len(words)
+        range_end = None    # last word ID of the multiword token we're in, if any
+        for row in sentence.rows:
+            if '.' in row.id:    # empty node
+                continue
+            if '-' in row.id:    # multiword token: its words have no space between them, and the last one takes its SpaceAfter
+                range_end = row.id.split('-')[1]
+                range_space = 'SpaceAfter=No' not in row.misc
+                continue
+
+            words.append(row.form)
+            if range_end is not None:
+                spaces.append(range_space if row.id == range_end else False)
+                if row.id == range_end:
+                    range_end = None
+            else:
+                spaces.append('SpaceAfter=No' not in row.misc)
+
+            # the root (and any word without a head) is its own head
+            heads.append(offset + int(row.head) - 1 if row.head not in ('0', '_') else len(words) - 1)
+            tags.append(row.upos if row.xpos == '_' else row.xpos)
+            poses.append(row.upos if row.upos != '_' else '')
+            morphs.append(row.feats if row.feats != '_' else '')
+            lemmas.append(row.lemma)
+            deps.append('ROOT' if row.deprel == 'root' else row.deprel)
+
+        sentence_ends.append(len(words) - 1)
+    for index in sentence_ends[:-1]:
+        spaces[index] = True
+
+    return Doc(vocab, words=words, spaces=spaces, tags=tags, pos=poses, morphs=morphs, lemmas=lemmas, heads=heads, deps=deps)
+
+# groups sentences into Docs of n_sents sentences each (the last one may have fewer)
+def sentences_to_docs(vocab: Vocab, sentences: Iterable[Sentence], n_sents: int=10) -> Iterator[Doc]:
+    group = []
+    for sentence in sentences:
+        group.append(sentence)
+        if len(group) == n_sents:
+            yield sentences_to_doc(vocab, group)
+            group = []
+    if group:
+        yield sentences_to_doc(vocab, group)
+
+# converts one .conllu file to {out_dir}/{name}.spacy, the same path `spacy convert` writes to
+# returns (out_path, number of docs)
+def convert_file(conllu_path: str, out_dir: str, n_sents: int=10) -> tuple[str, int]:
+    doc_bin = DocBin()
+    for doc in sentences_to_docs(Vocab(), read_conllu(conllu_path), n_sents):
+        doc_bin.add(doc)
+
+    out_path = os.path.join(out_dir, os.path.splitext(os.path.basename(conllu_path))[0] + '.spacy')
+    doc_bin.to_disk(out_path)
+    return out_path, len(doc_bin)
+
+# the DocBin of sentences grouped into Docs of n_sents sentences each, serialized
+def docbin_bytes(sentences: Iterable[Sentence], n_sents: int=10) -> bytes:
+    return DocBin(docs=sentences_to_docs(Vocab(), sentences, n_sents)).to_bytes()
+
+def _read_segment(segment: tuple[str, int, int]) -> DocBin:
+    path, offset, length = segment
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return DocBin().from_bytes(f.read(length))
+
+# concatenates the serialized DocBins in [(path, offset, length), ...] into one, in order
+def merge_docbin_segments(segments: list[tuple[str, int, int]]) -> DocBin:
+    merged = DocBin()
+    for segment in segments:
+        merged.merge(_read_segment(segment))
+    return merged
+
+# writes the docs of the serialized DocBins in [(path, offset, length), ...], in order, to {out_prefix}0.spacy, 
+# {out_prefix}1.spacy, ... with docs_per_shard docs each (the last one may have fewer)
+# returns the paths written
+def write_docbin_shards(out_prefix: str, segments: list[tuple[str, int, int]], docs_per_shard: int) -> list[str]:
+    vocab = Vocab()
+    paths = []
+    shard = DocBin()
+    for segment in segments:
+        for doc in _read_segment(segment).get_docs(vocab):
+            shard.add(doc)
+            if len(shard) == docs_per_shard:
+                paths.append(f'{out_prefix}{len(paths)}.spacy')
+                shard.to_disk(paths[-1])
+                shard = DocBin()
+    if len(shard):
+        paths.append(f'{out_prefix}{len(paths)}.spacy')
+        shard.to_disk(paths[-1])
+    return paths
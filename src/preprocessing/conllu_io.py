@@ -0,0 +1,124 @@
+# streaming CoNLL-U reader/writer shared by the augmentors
+# sentences are yielded one at a time from a generator so memory stays flat no matter how large the corpus is,
+# and sent_ids in the input are not required to be dense, start at 0, or even exist (i.e. files don't have to go
+# through remove_comments.py first)
+import os
+from typing import Iterator, NamedTuple
+
+SENT_ID_PREFIX = '# sent_id ='
+TEXT_PREFIX = '# text ='
+
+class Token(NamedTuple):
+    '''One CoNLL-U token line. Immutable, so sentences can share tokens instead of deep-copying them'''
+    id: str
+    form: str
+    lemma: str
+    upos: str
+    xpos: str
+    feats: str
+    head: str
+    deprel: str
+    deps: str
+    misc: str
+
+class Sentence:
+    '''A single CoNLL-U sentence: its comment lines and its token lines'''
+    __slots__ = ('comments', 'rows')
+
+    # comments: comment lines as-is (including '# sent_id = ...' if the file had one)
+    # rows: every token line, including multiword token ranges (e.g. '3-4') and empty nodes (e.g. '3.1')
+    def __init__(self, comments: list[str], rows: list[Token]):
+        self.comments = comments
+        self.rows = rows
+
+    # only the syntactic words (integer IDs), so that words()[int(head)-1] is the head of a word
+    def words(self) -> list[Token]:
+        return [row for row in self.rows if row.id.isdigit()]
+
+    # copy-on-write edit: returns a new sentence where words()[index] is replaced by token for each {index: token}
+    # every other token is shared with this sentence rather than copied
+    # the '# text' comment is dropped since it no longer matches the tokens
+    def edit(self, edits: dict[int, Token]) -> 'Sentence':
+        rows = self.rows.copy()
+        word_index = 0
+        for position, row in enumerate(rows):
+            if row.id.isdigit():
+                if word_index in edits:
+                    rows[position] = edits[word_index]
+                word_index += 1
+        return Sentence([c for c in self.comments if not c.startswith(TEXT_PREFIX)], rows)
+
+# yields every sentence in a .conllu file, one at a time
+# start/end: byte offsets to read between, e.g. from chunk_offsets; both must fall on sentence boundaries
+def read_conllu(conllu_path: str, start: int=0, end: int=None) -> Iterator[Sentence]:
+    comments = []
+    rows = []
+    with open(conllu_path, 'rb') as f:
+        f.seek(start)
+        position = start
+        for raw_line in f:
+            if end is not None and position >= end:
+                break
+            # utf-8-sig strips a BOM at the very start of the file
+            line = raw_line.decode('utf-8-sig' if position == 0 else 'utf-8').rstrip('\r\n')
+            position += len(raw_line)
+            if not line.strip():
+                if rows:
+                    yield Sentence(comments, rows)
+                comments, rows = [], []
+            elif line.startswith('#'):
+                comments.append(line)
+            else:
+                cols = line.split('\t')
+                if len(cols) == 10:    # ignore malformed lines
+                    rows.append(Token(*cols))
+    if rows:
+        yield Sentence(comments, rows)
+
+# splits a .conllu file into [(start, end), ...] byte ranges of roughly chunk_size bytes each
+# every range starts right after a blank line, so it can be read on its own with read_conllu(conllu_path, start, end)
+def chunk_offsets(conllu_path: str, chunk_size: int) -> list[tuple[int, int]]:
+    size = os.path.getsize(conllu_path)
+    offsets = [0]
+    with open(conllu_path, 'rb') as f:
+        while offsets[-1] + chunk_size < size:
+            f.seek(offsets[-1] + chunk_size)
+            f.readline()    # skip the rest of the line we landed in
+            for line in iter(f.readline, b''):
+                if not line.strip():
+                    break
+            position = f.tell()
+            if position >= size:
+                break
+            offsets.append(position)
+    offsets.append(size)
+    return list(zip(offsets, offsets[1:]))
+
+# formats a sentence back into CoNLL-U, assigning a new sent_id
+# any other comments are kept, in their original order, after the sent_id
+def format_sentence(rows: list[Token], sent_id: int, comments: list[str]=()) -> str:
+    lines = [f'{SENT_ID_PREFIX} {sent_id}']
+    lines.extend(comment for comment in comments if not comment.startswith(SENT_ID_PREFIX))
+    lines.extend('\t'.join(row) for row in rows)
+    return '\n'.join(lines) + '\n\n'
+
+class ConlluWriter:
+    '''Buffered CoNLL-U writer that numbers sentences from 0 in the order they are written'''
+
+    # buffer_size: bytes held in memory before they are flushed to disk in one chunk
+    def __init__(self, out_path: str, mode: str='w', buffer_size: int=1 << 20):
+        self.file = open(out_path, mode, encoding='utf-8', buffering=buffer_size)
+        self.count = 0
+
+    def write(self, sentence: Sentence):
+        self.file.write(format_sentence(sentence.rows, self.count, sentence.comments))
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,54 +1,166 @@
 # converts PTB constituency trees to CoNLL-U dependency trees
-# uses Stanford CoreNLP conversion script (make sure you have this installed)
+# uses Stanford CoreNLP conversion script (make sure you have this installed and on the CLASSPATH)
 # augmentor.py expects CoNLL-U, ensure you run this if your data is PTB format (like OntoNotes 5.0)
+# JVM startup dominates converting one small .parse file, so the trees of files_per_jvm files are concatenated and
+# converted by a single JVM, and its output is split back into one .conllu file per input by counting trees
+# the number of JVMs running at once is capped by available memory, and outputs newer than their input are skipped
 import os
 import subprocess
+import tempfile
 from concurrent.futures import ThreadPoolExecutor
 
+# memory a JVM needs on top of its heap, in MB (rough)
+JVM_OVERHEAD_MB = 256
+
+# MB of memory available for new processes, or None if it can't be determined on this platform
+def available_memory_mb():
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1 << 20)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+# number of trees in PTB text; parentheses inside tokens are escaped (-LRB-, -RRB-), so every tree is one balanced group
+def count_trees(text):
+    count = 0
+    depth = 0
+    for char in text:
+        if char == '(':
+            if depth == 0:
+                count += 1
+            depth += 1
+        elif char == ')':
+            depth -= 1
+    return count
+
 class Constituency2Dependency:
     FILE_TYPE = "parse"
+    CONVERTER = "edu.stanford.nlp.trees.ud.UniversalDependenciesConverter"
 
-    def __init__(self, in_dir, out_dir):
+    # jvm_memory_mb: heap of each JVM (-mx)
+    # files_per_jvm: .parse files converted by one JVM
+    # max_workers: JVMs running at once (default: number of cores); lowered to what fits in available memory
+    def __init__(self, in_dir, out_dir, jvm_memory_mb=1024, files_per_jvm=50, max_workers=None):
         self.in_dir = in_dir
         self.out_dir = out_dir
+        self.jvm_memory_mb = jvm_memory_mb
+        self.files_per_jvm = files_per_jvm
+        self.max_workers = max_workers
 
     def __find_ptb_files__(self):
         files = []
         count = 0
-        for root, _, filenames in os.walk(self.in_dir):  
+        for root, _, filenames in os.walk(self.in_dir):
             for file in filenames:
                 if file.endswith(self.FILE_TYPE):
                     files.append(os.path.join(root, file))
                     count += 1
         print(f"found {count} .parse files")
         return files
-    
-    def __convert__(self):       
+
+    def __output_file__(self, file):
+        return os.path.join(self.out_dir, os.path.basename(file).replace(".parse", ".conllu"))
+
+    # an output newer than its input was converted by an earlier run
+    def __up_to_date__(self, file):
+        output_file = self.__output_file__(file)
+        return os.path.exists(output_file) and os.path.getmtime(output_file) >= os.path.getmtime(file)
+
+    def __command__(self, tree_file):
+        return ["java", f"-mx{self.jvm_memory_mb}m", self.CONVERTER, "-treeFile", tree_file]
+
+    # as many JVMs as there are cores (or max_workers), but no more than fit in available memory
+    def __workers__(self):
+        workers = self.max_workers or os.cpu_count() or 1
+        memory = available_memory_mb()
+        if memory is not None:
+            workers = max(1, min(workers, memory // (self.jvm_memory_mb + JVM_OVERHEAD_MB)))
+        return workers
+
+    # writes output atomically, so an interrupted run never leaves a half-written file that looks up to date
+    def __write__(self, file, data):
+        output_file = self.__output_file__(file)
+        with open(output_file + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(output_file + ".tmp", output_file)
+
+    # converts a single file, with the JVM writing straight to the output file
+    # returns [(file, error)] if it failed, else []
+    def __convert_file__(self, file):
+        output_file = self.__output_file__(file)
+        with open(output_file + ".tmp", "wb") as out:
+            result = subprocess.run(self.__command__(file), stdout=out, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            os.remove(output_file + ".tmp")
+            return [(file, result.stderr.decode("utf-8", "replace").strip()[-500:] or f"exit code {result.returncode}")]
+        os.replace(output_file + ".tmp", output_file)
+        return []
+
+    # converts files in one JVM and splits its output back into one .conllu file per input
+    # if the JVM fails or its output doesn't have one sentence per tree, the files are converted one at a time instead
+    # so a single bad file doesn't take the rest of the batch down with it
+    # returns [(file, error), ...] for the files that could not be converted
+    def __convert_batch__(self, files):
+        if len(files) == 1:
+            return self.__convert_file__(files[0])
+
+        tree_counts = []
+        with tempfile.NamedTemporaryFile("w", suffix=".parse", delete=False, encoding="utf-8") as trees:
+            for file in files:
+                with open(file, "r", encoding="utf-8") as f:
+                    text = f.read()
+                tree_counts.append(count_trees(text))
+                trees.write(text + "\n")
+        try:
+            result = subprocess.run(self.__command__(trees.name), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        finally:
+            os.remove(trees.name)
+
+        sentences = [s for s in result.stdout.split(b"\n\n") if s.strip()] if result.returncode == 0 else []
+        if len(sentences) != sum(tree_counts):
+            exceptions = []
+            for file in files:
+                exceptions.extend(self.__convert_file__(file))
+            return exceptions
+
+        start = 0
+        for file, count in zip(files, tree_counts):
+            self.__write__(file, b"".join(s.strip(b"\n") + b"\n\n" for s in sentences[start:start + count]))
+            start += count
+        return []
+
+    def __convert__(self):
         print("converting... \n")
-        base_command = "java -mx1g edu.stanford.nlp.trees.ud.UniversalDependenciesConverter -treeFile {} > {}"
+        os.makedirs(self.out_dir, exist_ok=True)
 
+        files = self.__find_ptb_files__()
+        todo = [file for file in files if not self.__up_to_date__(file)]
+        print(f"{len(files) - len(todo)} files already up to date")
+
+        batches = [todo[i:i + self.files_per_jvm] for i in range(0, len(todo), self.files_per_jvm)]
+        workers = self.__workers__()
+        print(f"converting {len(todo)} files in {len(batches)} batches with {workers} JVMs at a time")
+
+        # threads are enough here; the work happens in the JVMs
         exceptions = []
-        command_list = []
-
-        for file in self.__find_ptb_files__():
-            input_file = file
-            output_file = os.path.join(self.out_dir, os.path.basename(file).replace(".parse", ".conllu"))
-            command = base_command.format(input_file, output_file)
-            command_list.append(command)
-
-        with ThreadPoolExecutor() as executor:
-            results = executor.map(subprocess.run, command_list)
-
-        for result in results:
-            if result.returncode != 0:
-                exceptions.append(result.returncode)
-        
-        print(f"could not convert {[e for e in exceptions]}")
+        with ThreadPoolExecutor(workers) as executor:
+            for batch_exceptions in executor.map(self.__convert_batch__, batches):
+                exceptions.extend(batch_exceptions)
+
+        for file, error in exceptions:
+            print(f"could not convert {file}: {error}")
         print(f"conversion complete! \n")
+        return exceptions
 
     def run(self):
-        self.__convert__()
-    
+        return self.__convert__()
+
 def main():
     in_dir = r"C:\Users\seank\Downloads\ontonotes-release-5.0\data\files\data\english\annotations"
     out_dir = "data/raw"
@@ -56,4 +168,4 @@ def main():
     c2d.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,126 @@
+# compiled, memory-mapped word -> word lexicon (e.g. the adjective <-> adverb maps)
+# a lookup binary-searches a sorted string table straight out of the mapped file, so nothing is parsed or built at load
+# time, and every process that opens the same file shares its pages through the OS page cache instead of each holding
+# its own dict (which copy-on-write after fork can't share either, since reference counting writes to every object)
+# file layout (little-endian):
+#   header: magic b'GLX1', entry count
+#   entries, sorted by key bytes: key offset, key length, value offset, value length (offsets from the start of the file)
+#   the UTF-8 bytes of every key and value
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import Iterator
+
+MAGIC = b'GLX1'
+HEADER = struct.Struct('<4sI')
+ENTRY = struct.Struct('<IIII')
+
+# writes {key: value} to lex_path as a compiled lexicon; atomic, so readers never see a half-written file
+# each writer uses its own temporary file, so processes compiling the same lexicon at once (e.g. workers starting on a 
+# fresh checkout) never write into each other's output
+def write_lexicon(mapping: dict[str, str], lex_path: str):
+    items = sorted((key.encode('utf-8'), value.encode('utf-8')) for key, value in mapping.items())
+    strings = bytearray()
+    entries = bytearray()
+    base = HEADER.size + ENTRY.size * len(items)
+    for key, value in items:
+        entries += ENTRY.pack(base + len(strings), len(key), base + len(strings) + len(key), len(value))
+        strings += key
+        strings += value
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(lex_path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(items)))
+            f.write(entries)
+            f.write(strings)
+        os.chmod(tmp_path, 0o644)    # mkstemp makes it readable by its owner only
+        os.replace(tmp_path, lex_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+# compiles a JSON {key: value} file (e.g. src/adj_to_adv.txt) into lex_path (default: same name with a .lex extension)
+# unless lex_path is already newer than it; returns lex_path
+def compile_lexicon(json_path: str, lex_path: str=None) -> str:
+    lex_path = lex_path or os.path.splitext(json_path)[0] + '.lex'
+    if not os.path.exists(lex_path) or os.path.getmtime(lex_path) < os.path.getmtime(json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            write_lexicon(json.load(f), lex_path)
+    return lex_path
+
+# the Lexicon for a JSON {key: value} file, compiling it first if needed (see compile_lexicon)
+def open_lexicon(json_path: str) -> 'Lexicon':
+    return Lexicon(compile_lexicon(json_path))
+
+class Lexicon:
+    '''Read-only, dict-like view of a compiled lexicon file'''
+
+    def __init__(self, lex_path: str):
+        self.lex_path = lex_path
+        self._open()
+
+    def _open(self):
+        with open(self.lex_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{self.lex_path} is not a compiled lexicon')
+
+    def _entry(self, index: int) -> tuple[int, int, int, int]:
+        return ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * index)
+
+    # the value bytes for key, or None
+    def _find(self, key: str) -> bytes:
+        target = key.encode('utf-8')
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, key_length, value_offset, value_length = self._entry(middle)
+            probe = self._map[key_offset:key_offset + key_length]
+            if probe < target:
+                low = middle + 1
+            elif probe > target:
+                high = middle
+            else:
+                return self._map[value_offset:value_offset + value_length]
+        return None
+
+    def get(self, key: str, default: str=None) -> str:
+        value = self._find(key)
+        return value.decode('utf-8') if value is not None else default
+
+    def __getitem__(self, key: str) -> str:
+        value = self._find(key)
+        if value is None:
+            raise KeyError(key)
+        return value.decode('utf-8')
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        for index in range(self._count):
+            key_offset, key_length, value_offset, value_length = self._entry(index)
+            yield (self._map[key_offset:key_offset + key_length].decode('utf-8'),
+                   self._map[value_offset:value_offset + value_length].decode('utf-8'))
+
+    def __iter__(self) -> Iterator[str]:
+        for key, _ in self.items():
+            yield key
+
+    # pickled as its path (e.g. when sent to a worker process), which maps the file again on the other side
+    def __getstate__(self):
+        return {'lex_path': self.lex_path}
+
+    def __setstate__(self, state):
+        self.lex_path = state['lex_path']
+        self._open()
+
+    def close(self):
+        self._map.close()
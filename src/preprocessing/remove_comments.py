@@ -1,28 +1,59 @@
+# normalizes CoNLL-U files: drops every comment line (# text, # newdoc, ...) and renumbers sent_ids from 0 in each file
+# files are streamed sentence by sentence (see conllu_io.py), converted on a process pool, and each output is written
+# to a temporary file first and then moved into place, so running this twice or interrupting it never leaves
+# duplicated or half-written data behind
+# strip_comments is the same normalization as a stage over a stream of sentences, e.g. in front of the augmentors
+# (run(strip_comments=True)), so the cleaned corpus never has to be written out separately
 import os
-import re
+import traceback
+import concurrent.futures as cf
+from typing import Iterable, Iterator
+from conllu_io import ConlluWriter, Sentence, read_conllu
 
-in_path = "data/raw/gum"
-out_path = "data/raw/gum_cleaned"
+# the sentences without their comments; sent_ids are assigned again when they are written (see ConlluWriter)
+def strip_comments(sentences: Iterable[Sentence]) -> Iterator[Sentence]:
+    for sentence in sentences:
+        yield Sentence([], sentence.rows)
 
-sent_id_pat = re.compile(r"#\s(sent_id)\s.*")
-text_pat = re.compile(r".*\t.*\t.*\t.*\t.*\t.*\t.*\t.*\t.*\t.*")
+# normalizes in_file into out_file; returns the number of sentences written
+def normalize_file(in_file: str, out_file: str) -> int:
+    with ConlluWriter(out_file + '.tmp') as writer:
+        for sentence in strip_comments(read_conllu(in_file)):
+            writer.write(sentence)
+    os.replace(out_file + '.tmp', out_file)
+    return writer.count
 
-files = os.listdir(in_path)
+# normalizes every .conllu file in in_dir into the same relative path in out_dir (which can be in_dir itself)
+# max_workers: processes normalizing files at once (default: number of cores)
+# returns {in_file: error} for every file that could not be normalized
+def normalize_dir(in_dir: str, out_dir: str, max_workers: int=None) -> dict[str, Exception]:
+    jobs = {}
+    for root, _, filenames in os.walk(in_dir):
+        for filename in sorted(filenames):
+            if filename.endswith('.conllu'):
+                out_root = os.path.join(out_dir, os.path.relpath(root, in_dir))
+                os.makedirs(out_root, exist_ok=True)
+                jobs[os.path.join(root, filename)] = os.path.join(out_root, filename)
 
-for file in files:
-    count = 0
-    with open(os.path.join(in_path, file), "r", encoding='utf-8') as f, open(os.path.join(out_path, file), "a", encoding='utf-8') as out_f:
-        lines = f.readlines()
-        prev_line = ''
-        for line in lines:
-            sent_id = sent_id_pat.match(line)
-            text = text_pat.match(line)
-            if text:
-                out_f.write(line)
-            elif sent_id:
-                if prev_line == '\n':
-                    out_f.write('\n')
-                out_f.write(line[:12] + str(count) + '\n')
-                count += 1
-            prev_line = line
-        out_f.write('\n')
\ No newline at end of file
+    failures = {}
+    with cf.ProcessPoolExecutor(max_workers) as executor:
+        futures = {executor.submit(normalize_file, in_file, out_file): in_file for in_file, out_file in jobs.items()}
+        for future in cf.as_completed(futures):
+            in_file = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failures[in_file] = e
+                print(f'Error normalizing {in_file}: {e}')
+                traceback.print_exc()
+
+    print(f'Normalized {len(jobs) - len(failures)} of {len(jobs)} files')
+    return failures
+
+def main():
+    in_path = "data/raw/gum"
+    out_path = "data/raw/gum_cleaned"
+    normalize_dir(in_path, out_path)
+
+if __name__ == "__main__":
+    main()
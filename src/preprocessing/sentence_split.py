@@ -0,0 +1,138 @@
+# splits a corpus into train/dev/(test) sets by sentence rather than by file, so the ratios hold however much the
+# file sizes vary
+# every sentence (for .conllu files) or Doc (for .spacy files) is assigned to a set by a stable hash of its words, so
+# the same corpus always splits the same way, a sentence and its exact duplicates always land in the same set,
+# and adding files later doesn't move anything that was already assigned
+# input is streamed and each set is written as shards of roughly equal size, so memory stays flat on millions of sentences
+# the source files are left where they are
+import glob
+import hashlib
+import os
+from conllu_io import ConlluWriter, read_conllu
+
+class SentenceSplit:
+    '''Streams sentences or Docs into hash-assigned, sharded train/dev/test sets'''
+
+    # source_dir: directory containing .conllu or .spacy files (searched recursively)
+    # out_dir: each set is written to {out_dir}/{name}/{name}_{shard}.{conllu|spacy}
+    # ratios: {name: share}; shares must add up to 1
+    # shard_size: sentences (CoNLL-U) or Docs (DocBin) per output shard
+    # salt: changes the assignment; use a different one for a different but still reproducible split
+    def __init__(self, source_dir: str, out_dir: str, ratios: dict[str, float]=None, shard_size: int=10000, salt: str=''):
+        self.source_dir = source_dir
+        self.out_dir = out_dir
+        self.ratios = ratios or {'train': 0.8, 'dev': 0.2}
+        self.shard_size = shard_size
+        self.salt = salt
+
+        if abs(sum(self.ratios.values()) - 1) > 1e-9:
+            raise ValueError(f'Split ratios must add up to 1, got {self.ratios}')
+
+        # upper bound of each set's share of the hash space, in order
+        self.bounds = []
+        total = 0
+        for name, ratio in self.ratios.items():
+            total += ratio
+            self.bounds.append((total, name))
+
+    # the set a sentence goes to, from a hash of its words
+    def assign(self, words: list[str]) -> str:
+        digest = hashlib.blake2b(f'{self.salt}\t{" ".join(words)}'.encode('utf-8'), digest_size=8).digest()
+        point = int.from_bytes(digest, 'big') / (1 << 64)
+        for bound, name in self.bounds:
+            if point < bound:
+                return name
+        return self.bounds[-1][1]    # rounding
+
+    # every {extension} file in source_dir, in a fixed order, leaving out anything already written to out_dir
+    def source_files(self, extension: str) -> list[str]:
+        out_dirs = {os.path.abspath(os.path.join(self.out_dir, name)) for name in self.ratios}
+        files = []
+        for root, dirnames, filenames in os.walk(self.source_dir):
+            dirnames[:] = sorted(dirname for dirname in dirnames if os.path.abspath(os.path.join(root, dirname)) not in out_dirs)
+            files.extend(os.path.join(root, filename) for filename in sorted(filenames) if filename.endswith(extension))
+        return files
+
+    # splits every .conllu file in source_dir; sent_ids are renumbered per shard
+    # returns {name: number of sentences}
+    def split_conllu(self) -> dict[str, int]:
+        self._clear('conllu')
+        writers = {}
+        shards = {name: 0 for name in self.ratios}
+        counts = {name: 0 for name in self.ratios}
+        try:
+            for conllu_path in self.source_files('.conllu'):
+                for sentence in read_conllu(conllu_path):
+                    name = self.assign([row.form for row in sentence.words()])
+                    if counts[name] % self.shard_size == 0:    # current shard is full (or there is none yet)
+                        if name in writers:
+                            writers[name].close()
+                        writers[name] = ConlluWriter(self._shard_path(name, shards[name], 'conllu'))
+                        shards[name] += 1
+                    writers[name].write(sentence)
+                    counts[name] += 1
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        self._report(counts, 'sentences')
+        return counts
+
+    # splits every .spacy file in source_dir, one Doc at a time
+    # returns {name: number of Docs}
+    def split_docbin(self) -> dict[str, int]:
+        from spacy.tokens import DocBin    # only needed for DocBin input
+        from spacy.vocab import Vocab
+
+        self._clear('spacy')
+        vocab = Vocab()
+        doc_bins = {name: DocBin() for name in self.ratios}
+        shards = {name: 0 for name in self.ratios}
+        counts = {name: 0 for name in self.ratios}
+        for spacy_path in self.source_files('.spacy'):
+            for doc in DocBin().from_disk(spacy_path).get_docs(vocab):
+                name = self.assign([token.text for token in doc])
+                doc_bins[name].add(doc)
+                counts[name] += 1
+                if len(doc_bins[name]) == self.shard_size:
+                    doc_bins[name].to_disk(self._shard_path(name, shards[name], 'spacy'))
+                    doc_bins[name] = DocBin()
+                    shards[name] += 1
+
+        for name, doc_bin in doc_bins.items():
+            if len(doc_bin):
+                doc_bin.to_disk(self._shard_path(name, shards[name], 'spacy'))
+
+        self._report(counts, 'docs')
+        return counts
+
+    # splits .spacy files if source_dir has any, else .conllu files
+    def split(self) -> dict[str, int]:
+        if self.source_files('.spacy'):
+            return self.split_docbin()
+        return self.split_conllu()
+
+    # creates every set's directory, even one that ends up empty, and removes shards left over from an earlier split,
+    # which may have had more of them
+    def _clear(self, extension: str):
+        for name in self.ratios:
+            set_dir = os.path.join(self.out_dir, name)
+            os.makedirs(set_dir, exist_ok=True)
+            for path in glob.glob(os.path.join(glob.escape(set_dir), f'{glob.escape(name)}_*.{extension}')):
+                os.remove(path)
+
+    def _shard_path(self, name: str, shard: int, extension: str) -> str:
+        return os.path.join(self.out_dir, name, f'{name}_{shard}.{extension}')
+
+    def _report(self, counts: dict[str, int], unit: str):
+        total = sum(counts.values())
+        for name, count in counts.items():
+            print(f'{name}: {count} {unit} ({count / total if total else 0:.2%})')
+
+def main():
+    in_dir = r"data/processed/gumaug"
+    ss = SentenceSplit(in_dir, in_dir, {'train': 0.8, 'dev': 0.2})
+    ss.split()
+
+if __name__ == "__main__":
+    main()
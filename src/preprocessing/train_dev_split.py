@@ -2,6 +2,8 @@ import os
 import shutil
 from random import sample
 
+# splits by whole file, so the dev share is only close to dev_size when files are about the same size
+# see sentence_split.py for a split by sentence
 class TrainDevSplit:
 
     def __init__(self, source_dir, dev_size=0.2):
@@ -22,7 +24,9 @@ class TrainDevSplit:
         train_files = sample(files, int((1-self.dev_size) * len(files)))
 
         # the remaining files will be the dev set
-        dev_files = [f for f in files if f not in train_files]
+        # (a set, so this is one pass instead of a scan of train_files per file)
+        train_set = set(train_files)
+        dev_files = [f for f in files if f not in train_set]
 
         # Move the selected files to the train directory
         for file in train_files:
@@ -32,4 +32,5 @@ def split(data_dir):
     for file in validate:
         os.rename(data_dir+"/"+file, data_dir + "/validate/" + file)
 
-split(r"data/raw/gum")
\ No newline at end of file
+if __name__ == "__main__":
+    split(r"data/raw/gum")
@@ -12,38 +12,73 @@ class EnglishModel:
     def __init__(self, nlp, get_forms, rules):
         '''
         nlp: a spaCy pipeline
-        get_forms: a function that takes (word, lemma, tag) and returns the desired tag form of that word
+        get_forms: a GetForms object; get_forms.get_forms(token, tag) returns the desired tag form of that token
         rules: a list of either tuples or functions that enforce rules on the input text
               [(dep_rel, child_tag_list, head_tag_list, correct_tag_list, enforce_child_or_head, error_message), ...]
               a function as a rule must take a Doc object and get_forms as input and return (error_message, corrected_text)
         '''
         self.nlp = nlp
         self.get_forms = get_forms    
-        self.rules = rules
+        # a tuple, since compiled_rules is built from it once; use add_rule to add rules later
+        self.rules = tuple(rules)
+        self.compiled_rules = self.compile_rules(self.rules)
+
+    def add_rule(self, rule):
+        self.rules += (rule,)
+        self.compiled_rules = self.compile_rules(self.rules)
+
+    # builds a lookup from dep_rel to the tuple rules that use it, with tag lists turned into sets
+    # so each token only checks the rules for its own dependency label
+    # {dep_rel: [(rule_index, child_tags, head_tags, correct_tags, suggestion_tag, enforce_child_or_head, error_message), ...]}
+    @staticmethod
+    def compile_rules(rules):
+        compiled = {}
+        for index, rule in enumerate(rules):
+            if callable(rule):
+                continue
+            dep_rel, child_tag_list, head_tag_list, correct_tag_list, child, error_message = rule
+            compiled.setdefault(dep_rel, []).append((
+                index, frozenset(child_tag_list), frozenset(head_tag_list), frozenset(correct_tag_list),
+                correct_tag_list[0], child, error_message
+            ))
+        return compiled
     
+    # parses the input text once, then runs every rule against the resulting Doc
     def enforce(self, input_text):
-        errors = []
-        for rule in self.rules:
-            # if rule is a function, call it with the input text
-            # else, if rule is simply using dep_rel, child, and parent, apply the rule
+        return self.enforce_doc(self.nlp(input_text))
+
+    # batched version of enforce; streams texts through nlp.pipe and yields one format_errors result per text, in input order
+    # batch_size=None uses the pipeline's own default batch size
+    def enforce_many(self, texts, batch_size=None, n_process=1):
+        for doc in self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+            yield self.enforce_doc(doc)
+
+    # same as enforce, but for callers that already have a parsed Doc
+    def enforce_doc(self, doc):
+        # (rule_index, error) pairs; sorted at the end so errors come out in rule order, as before
+        found = []
+        for index, rule in enumerate(self.rules):
+            # if rule is a function, call it with the parsed Doc
+            # tuple rules are handled below in a single pass over the tokens
             if callable(rule):
-                # call rule(self.input_text, self.get_forms) where input_text is a Doc object
+                # call rule(doc, self.get_forms)
                 # rule should return (error_message, corrected_word_index, corrected_word)
-                error_message, corrected_word_index, corrected_word = rule(input_text, self.get_forms)
+                error_message, corrected_word_index, corrected_word = rule(doc, self.get_forms)
                 if error_message:
-                    errors.append((error_message, corrected_word_index, corrected_word))
-            else:
-                dep_rel, child_tag_list, head_tag_list, correct_tag_list, child, error_message = rule
-                for token in self.nlp(input_text):
-                    if token.dep_ == dep_rel:
-                        if token.head.tag_ in head_tag_list and token.tag_ in child_tag_list:
-                            if not child:
-                                if token.head.tag_ not in correct_tag_list:
-                                    errors.append((error_message, token.head.i, self.get_forms.get_forms(token.head.text, correct_tag_list[0])))
-                            else:
-                                if token.tag_ not in correct_tag_list:
-                                    errors.append((error_message, token.i, self.get_forms.get_forms(token.text, correct_tag_list[0])))
-        return self.format_errors(errors)
+                    found.append((index, (error_message, corrected_word_index, corrected_word)))
+
+        for token in doc:
+            for index, child_tags, head_tags, correct_tags, suggestion_tag, child, error_message in self.compiled_rules.get(token.dep_, ()):
+                if token.head.tag_ in head_tags and token.tag_ in child_tags:
+                    if not child:
+                        if token.head.tag_ not in correct_tags:
+                            found.append((index, (error_message, token.head.i, self.get_forms.get_forms(token.head, suggestion_tag))))
+                    else:
+                        if token.tag_ not in correct_tags:
+                            found.append((index, (error_message, token.i, self.get_forms.get_forms(token, suggestion_tag))))
+
+        found.sort(key=lambda item: item[0])
+        return self.format_errors([error for _, error in found])
     
     # JSON format: {"errors": [{"error": "error message", "corrected_word_index": 0, "suggestion": "corrected_word"}]
     def format_errors(self, errors):